@@ -0,0 +1,81 @@
+"""Batched area queries with array results.
+
+Runs many bb, point or circle queries in one call and returns the hits in CSR
+form: for query i the shape ids are ids[offsets[i]:offsets[i + 1]]. Shape ids
+come from the shared ShapeRegistry table, ShapeRegistry.shape_of(id) gives
+the shape back. The result arrays are views on buffers that are reused on the
+next call, copy them if they must be kept.
+
+pymunk itself still creates its result list for every single query, the
+batch avoids everything built on top of that (per-hit tuples, result lists of
+lists, BB conversions by the caller).
+"""
+
+import numpy as np
+
+import pymunk
+
+from registry import ShapeRegistry
+
+
+class BatchQuery:
+    def __init__(self, space, shape_filter=pymunk.ShapeFilter(), capacity=256):
+        self.space = space
+        self.shape_filter = shape_filter
+        self.offsets = np.zeros(capacity + 1, dtype=np.int32)
+        self.hits = np.zeros(capacity, dtype=np.int32)
+
+
+    def reserve(self, queries, hits):
+        if queries + 1 > len(self.offsets):
+            self.offsets = np.zeros(max(queries + 1, len(self.offsets) * 2), dtype=np.int32)
+        if hits > len(self.hits):
+            new_hits = np.zeros(max(hits, len(self.hits) * 2), dtype=np.int32)
+            new_hits[:len(self.hits)] = self.hits
+            self.hits = new_hits
+
+
+    def collect(self, results):
+        #results yields one list of shapes per query
+        count = 0
+        for i, shapes in enumerate(results):
+            self.offsets[i] = count
+            if shapes:
+                self.reserve(i, count + len(shapes))
+                self.hits[count:count + len(shapes)] = [ShapeRegistry.id_of(shape) for shape in shapes]
+                count += len(shapes)
+        return count
+
+
+    def bb_query(self, boxes):
+        '''
+        boxes is a (n, 4) array of left, bottom, right, top.
+        '''
+        n = len(boxes)
+        self.reserve(n, 0)
+        bb_query = self.space.bb_query
+        shape_filter = self.shape_filter
+        count = self.collect(bb_query(pymunk.BB(*box), shape_filter) for box in boxes)
+        self.offsets[n] = count
+        return self.offsets[:n + 1], self.hits[:count]
+
+
+    def circle_query(self, centers, radii):
+        '''
+        centers is a (n, 2) array, radii a single radius or one per center.
+        A radius of 0 is a plain point query.
+        '''
+        n = len(centers)
+        if np.isscalar(radii):
+            radii = np.full(n, radii)
+        self.reserve(n, 0)
+        point_query = self.space.point_query
+        shape_filter = self.shape_filter
+        count = self.collect([info.shape for info in point_query(tuple(center), radius, shape_filter)]
+                             for center, radius in zip(centers, radii))
+        self.offsets[n] = count
+        return self.offsets[:n + 1], self.hits[:count]
+
+
+    def point_query(self, points):
+        return self.circle_query(points, 0)
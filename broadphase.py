@@ -0,0 +1,206 @@
+"""Broadphase advisor.
+
+Samples the shapes of a running space and benchmarks the default bounding box
+tree against the spatial hash with a few cell sizes, on a throwaway copy of
+the space. The fastest configuration is applied to the real space and the
+choice is re-evaluated when the shape count or the typical shape size change
+materially. An evaluation is spread over the following frames: update()
+copies at most clone_per_frame objects or runs at most steps_per_frame
+benchmark steps, so it never stalls a frame. The copy of the scene may mix
+positions of a few consecutive frames, which doesn't matter to the timing.
+
+Chipmunk can't switch a space back from the spatial hash to the tree, so once
+the hash is in use only its cell size is re-tuned. Queries on the hash aren't
+safe from several threads, so don't advise a space a threaded RaySensor casts
+into.
+"""
+
+import statistics
+import time
+
+import pymunk
+
+from constraint_copy import rebuild_constraint
+
+
+class BroadphaseAdvisor:
+    cell_factors = (1.0, 1.5, 2.0, 3.0)
+
+    def __init__(self, space, dt=1.0 / 60.0, bench_steps=30, check_every=120, change_ratio=0.5, min_shapes=10, steps_per_frame=5, clone_per_frame=100, verbose=True):
+        self.space = space
+        self.dt = dt
+        self.bench_steps = bench_steps
+        self.check_every = check_every
+        self.change_ratio = change_ratio
+        self.min_shapes = min_shapes
+        self.steps_per_frame = steps_per_frame
+        self.clone_per_frame = clone_per_frame
+        self.verbose = verbose
+        #running evaluation, a generator advanced by update
+        self.pending = None
+
+        self.frame = 0
+        self.uses_spatial_hash = False
+        self.config = ("tree", None, None)
+        self.results = {}
+        self.sampled_count = 0
+        self.sampled_size = 0.0
+
+
+    def sample(self):
+        sizes = []
+        for shape in self.space.shapes:
+            if shape.body.body_type == pymunk.Body.STATIC:
+                continue
+            bb = shape.bb
+            sizes.append(max(bb.right - bb.left, bb.top - bb.bottom))
+        if not sizes:
+            return 0, 0.0
+        return len(self.space.shapes), statistics.median(sizes)
+
+
+    def population_changed(self, count, size):
+        if self.sampled_count == 0:
+            return count >= self.min_shapes
+        count_change = abs(count - self.sampled_count) / self.sampled_count
+        size_change = abs(size - self.sampled_size) / self.sampled_size if self.sampled_size else 1.0
+        return count_change > self.change_ratio or size_change > self.change_ratio
+
+
+    def update(self):
+        #call once per frame, the space is only sampled every check_every frames
+        self.frame += 1
+        if self.pending is not None:
+            if next(self.pending, None) is None:
+                self.pending = None
+            return
+        if self.frame % self.check_every != 0:
+            return
+        count, size = self.sample()
+        if count >= self.min_shapes and size > 0 and self.population_changed(count, size):
+            self.pending = self.evaluation(count, size)
+
+
+    def candidates(self, count, size):
+        configs = []
+        if not self.uses_spatial_hash:
+            configs.append(("tree", None, None))
+        for factor in self.cell_factors:
+            configs.append(("hash", size * factor, max(1000, count * 10)))
+        return configs
+
+
+    def evaluate(self, count=None, size=None):
+        #the whole evaluation at once
+        if count is None:
+            count, size = self.sample()
+        for x in self.evaluation(count, size):
+            pass
+        return self.config
+
+
+    def evaluation(self, count, size):
+        #yields between the parts of the work, each candidate runs on a copy made when its turn comes
+        results = {}
+        for config in self.candidates(count, size):
+            space = yield from cloning(self.space, self.clone_per_frame)
+            if config[0] == "hash":
+                space.use_spatial_hash(config[1], config[2])
+            elapsed = 0.0
+            for i in range(self.bench_steps):
+                start = time.perf_counter()
+                space.step(self.dt)
+                elapsed += time.perf_counter() - start
+                if (i + 1) % self.steps_per_frame == 0:
+                    yield True
+            results[config] = elapsed * 1000
+        self.results = results
+        best = min(self.results, key=self.results.get)
+
+        if best != self.config:
+            if best[0] == "hash":
+                self.space.use_spatial_hash(best[1], best[2])
+                self.uses_spatial_hash = True
+            self.config = best
+            if self.verbose:
+                print(f"broadphase: {self.describe()} for {count} shapes (median size {size:.1f})")
+
+        self.sampled_count, self.sampled_size = count, size
+
+
+    def describe(self):
+        if self.config[0] == "tree":
+            return "bb tree"
+        return f"spatial hash, cell {self.config[1]:.1f}, count {self.config[2]}"
+
+
+
+def clone_body(body):
+    new_body = pymunk.Body(body.mass, body.moment, body.body_type)
+    new_body.position = body.position
+    new_body.angle = body.angle
+    new_body.velocity = body.velocity
+    new_body.angular_velocity = body.angular_velocity
+    return new_body
+
+
+def cloning(space, chunk=0):
+    '''
+    Copies bodies, shapes and constraints into a new space, callbacks don't matter to the broadphase.
+    A generator that yields after every chunk objects (never with chunk 0) and returns the copy.
+    '''
+    clone = pymunk.Space()
+    clone.gravity = space.gravity
+    clone.iterations = space.iterations
+    clone.damping = space.damping
+    copied = 0
+
+    bodies = {space.static_body: clone.static_body}
+    for body in space.bodies:
+        bodies[body] = clone_body(body)
+        clone.add(bodies[body])
+        copied += 1
+        if chunk and copied % chunk == 0:
+            yield True
+
+    for shape in space.shapes:
+        body = bodies.get(shape.body)
+        if body is None:
+            #a static body that isn't in space.bodies
+            body = clone_body(shape.body)
+            bodies[shape.body] = body
+            clone.add(body)
+
+        if isinstance(shape, pymunk.Circle):
+            new_shape = pymunk.Circle(body, shape.radius, shape.offset)
+        elif isinstance(shape, pymunk.Segment):
+            new_shape = pymunk.Segment(body, shape.a, shape.b, shape.radius)
+        else:
+            new_shape = pymunk.Poly(body, shape.get_vertices(), radius=shape.radius)
+        if body.body_type == pymunk.Body.DYNAMIC and shape.mass:
+            new_shape.mass = shape.mass
+        new_shape.friction = shape.friction
+        new_shape.elasticity = shape.elasticity
+        new_shape.filter = shape.filter
+        new_shape.sensor = shape.sensor
+        clone.add(new_shape)
+        copied += 1
+        if chunk and copied % chunk == 0:
+            yield True
+
+    #joints keep the scene moving like the real one, bodies outside of the space (a kinematic anchor) are copied too
+    constraints = []
+    for constraint in space.constraints:
+        for body in (constraint.a, constraint.b):
+            if body not in bodies:
+                bodies[body] = clone_body(body)
+        constraints.append(rebuild_constraint(constraint, bodies[constraint.a], bodies[constraint.b]))
+    clone.add(*constraints)
+    return clone
+
+
+def clone_space(space):
+    try:
+        next(cloning(space))
+    except StopIteration as done:
+        return done.value
@@ -0,0 +1,154 @@
+"""Collision filter categories.
+
+CollFilter hands out one category bit per named filter and gives the bit back
+when the filter is released, so filters can come and go without running out
+of the 32 available categories. Group ids from new_group() are counted: the
+caller holds one reference until release_group(), every filter made with the
+group holds one until release(), and the group is handed out again only once
+nobody holds it. Groups that didn't come from new_group() are never reused.
+Masks are composed with bitwise operations and a whole "who collides with
+whom" matrix can be turned into ShapeFilters in one go.
+reserve(name) makes a category that only queries look for: it's left out of
+every mask built here, so putting it on a shape doesn't change collisions.
+"""
+
+import pymunk
+
+
+class CollFilter:
+    max_categories = 32
+    all_filters = {}
+    free_bits = []
+    next_bit = 0
+    free_groups = []
+    next_group = 1
+    #group from new_group() -> references still held
+    group_users = {}
+    #categories kept out of collision masks
+    reserved = 0
+
+    @classmethod
+    def allocate_bit(cls):
+        if cls.free_bits:
+            return cls.free_bits.pop()
+        if cls.next_bit >= cls.max_categories:
+            raise Exception(f"All the {cls.max_categories} collision categories are in use.")
+        cls.next_bit += 1
+        return cls.next_bit - 1
+
+    @classmethod
+    def new_group(cls):
+        if cls.free_groups:
+            group = cls.free_groups.pop()
+        else:
+            cls.next_group += 1
+            group = cls.next_group - 1
+        cls.group_users[group] = 1
+        return group
+
+    @classmethod
+    def use_group(cls, group):
+        if group in cls.group_users:
+            cls.group_users[group] += 1
+
+    @classmethod
+    def release_group(cls, group):
+        if group not in cls.group_users:
+            raise Exception(f"Group {group} wasn't made by new_group() or is already released.")
+        cls.group_users[group] -= 1
+        if cls.group_users[group] == 0:
+            del cls.group_users[group]
+            cls.free_groups.append(group)
+
+    @classmethod
+    def get(cls, name):
+        return cls.all_filters[name]
+
+    @classmethod
+    def reserve(cls, name):
+        #the same name gives the same category
+        if name in cls.all_filters:
+            return cls.all_filters[name]
+        collfilter = cls(name, mask=0)
+        cls.reserved |= collfilter.category
+        return collfilter
+
+    @classmethod
+    def collision_mask(cls, mask):
+        return mask & ~cls.reserved
+
+
+    def __init__(self, name, group=0, mask=None):
+        self.name = name
+        if name in CollFilter.all_filters.keys():
+            raise Exception(f"{name} is already a filter.")
+        self.bit = CollFilter.allocate_bit()
+        CollFilter.all_filters[name] = self
+        self.category = 1 << self.bit
+        #a filter holding a reference keeps its group from being handed out again
+        self.group_held = group in CollFilter.group_users
+        CollFilter.use_group(group)
+        if mask is None:
+            mask = pymunk.ShapeFilter.ALL_MASKS()
+        self.filter = pymunk.ShapeFilter(group=group, categories=self.category, mask=CollFilter.collision_mask(mask))
+
+    def set_mask(self, mask):
+        self.filter = pymunk.ShapeFilter(group=self.filter.group, categories=self.category, mask=CollFilter.collision_mask(mask))
+        return self.filter
+
+    def release(self):
+        #a second release would hand the same bit to two filters
+        if CollFilter.all_filters.get(self.name) is not self:
+            raise Exception(f"{self.name} is already released.")
+        del CollFilter.all_filters[self.name]
+        CollFilter.free_bits.append(self.bit)
+        CollFilter.reserved &= ~self.category
+        if self.group_held:
+            self.group_held = False
+            CollFilter.release_group(self.filter.group)
+
+
+    @classmethod
+    def build_table(cls, names, matrix):
+        '''
+        matrix[i][j] tells if the filter names[i] collides with names[j]. Chipmunk only lets two shapes
+        collide when each one is in the mask of the other, so an asymmetric entry acts as False.
+        Returns a {name: ShapeFilter} table with the masks already set.
+        '''
+        categories = [cls.get(name).category for name in names]
+        table = {}
+        for name, row in zip(names, matrix):
+            mask = 0
+            for category, collides in zip(categories, row):
+                if collides:
+                    mask |= category
+            table[name] = cls.get(name).set_mask(mask)
+        return table
+
+
+
+class CollFilterMask:
+    def __new__(cls, whitelist, *params):
+        obj = object.__new__(cls)
+        if whitelist:
+            obj.__whitelist_init(params)
+        else:
+            obj.__blacklist_init(params)
+        return obj
+
+    @staticmethod
+    def categories_of(filter_obj):
+        #accepts CollFilter instances or objects with a shape
+        if isinstance(filter_obj, CollFilter):
+            return filter_obj.category
+        return filter_obj.shape.filter.categories
+
+    def __whitelist_init(self, filter_objs):
+        self.mask = 0
+        for obj in filter_objs:
+            self.mask |= CollFilterMask.categories_of(obj)
+
+    def __blacklist_init(self, filter_objs):
+        self.mask = CollFilter.collision_mask(pymunk.ShapeFilter.ALL_MASKS())
+        for obj in filter_objs:
+            self.mask &= ~CollFilterMask.categories_of(obj)
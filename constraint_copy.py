@@ -0,0 +1,60 @@
+"""Copying constraints.
+
+Chipmunk can't change the bodies of a constraint after it's made, so moving a
+constraint to other bodies (the static body of another space, a copy of a
+body) means building a new one of the same type and settings.
+rebuild_constraint does that for every constraint type of pymunk, it's used
+by the regions of RegionWorld and by the throwaway copies of the broadphase
+advisor.
+"""
+
+import pymunk
+
+
+def rebuild_constraint(constraint, a, b):
+    '''
+    The same constraint between a and b, which replace constraint.a and constraint.b (usually a static
+    body of another space). Anchors keep their world position, the angular constraints need the
+    replaced bodies to have the same angle as the old ones.
+    '''
+    old_a, old_b = constraint.a, constraint.b
+
+    def on_a(point):
+        return point if a is old_a else a.world_to_local(old_a.local_to_world(point))
+
+    def on_b(point):
+        return point if b is old_b else b.world_to_local(old_b.local_to_world(point))
+
+    c = constraint
+    if isinstance(c, pymunk.PinJoint):
+        new = pymunk.PinJoint(a, b, on_a(c.anchor_a), on_b(c.anchor_b))
+        new.distance = c.distance
+    elif isinstance(c, pymunk.SlideJoint):
+        new = pymunk.SlideJoint(a, b, on_a(c.anchor_a), on_b(c.anchor_b), c.min, c.max)
+    elif isinstance(c, pymunk.PivotJoint):
+        new = pymunk.PivotJoint(a, b, on_a(c.anchor_a), on_b(c.anchor_b))
+    elif isinstance(c, pymunk.GrooveJoint):
+        new = pymunk.GrooveJoint(a, b, on_a(c.groove_a), on_a(c.groove_b), on_b(c.anchor_b))
+    elif isinstance(c, pymunk.DampedSpring):
+        new = pymunk.DampedSpring(a, b, on_a(c.anchor_a), on_b(c.anchor_b), c.rest_length, c.stiffness, c.damping)
+    elif isinstance(c, pymunk.SimpleMotor):
+        new = pymunk.SimpleMotor(a, b, c.rate)
+    else:
+        if a.angle != old_a.angle or b.angle != old_b.angle:
+            raise Exception(f"Can't move a {type(c).__name__} to a body with another angle.")
+        if isinstance(c, pymunk.DampedRotarySpring):
+            new = pymunk.DampedRotarySpring(a, b, c.rest_angle, c.stiffness, c.damping)
+        elif isinstance(c, pymunk.RotaryLimitJoint):
+            new = pymunk.RotaryLimitJoint(a, b, c.min, c.max)
+        elif isinstance(c, pymunk.RatchetJoint):
+            new = pymunk.RatchetJoint(a, b, c.phase, c.ratchet)
+            new.angle = c.angle
+        elif isinstance(c, pymunk.GearJoint):
+            new = pymunk.GearJoint(a, b, c.phase, c.ratio)
+        else:
+            raise Exception(f"Can't rebuild a {type(c).__name__}.")
+    new.max_force = c.max_force
+    new.max_bias = c.max_bias
+    new.error_bias = c.error_bias
+    new.collide_bodies = c.collide_bodies
+    return new
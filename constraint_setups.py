@@ -0,0 +1,162 @@
+"""
+Setups of the constraints demo, one per constraint type.
+
+Each setup builds its bodies and its constraint in a box_size box at
+box_offset and returns the constraint. Only pymunk is needed, so the demo and
+the headless benchmark build exactly the same rigs.
+"""
+
+import math
+
+import pymunk
+from pymunk.vec2d import Vec2d
+
+box_size = 200
+
+
+def add_ball(space, pos, box_offset):
+    body = pymunk.Body()
+    body.position = Vec2d(*pos) + box_offset
+    shape = pymunk.Circle(body, 20)
+    shape.mass = 1
+    shape.friction = 0.7
+    space.add(body, shape)
+    return body
+
+
+def add_bar(space, pos, box_offset):
+    body = pymunk.Body()
+    body.position = Vec2d(*pos) + box_offset
+    shape = pymunk.Segment(body, (0, 40), (0, -40), 6)
+    shape.mass = 2
+    shape.friction = 0.7
+    space.add(body, shape)
+    return body
+
+
+def add_lever(space, pos, box_offset):
+    body = pymunk.Body()
+    body.position = pos + Vec2d(*box_offset) + (0, -20)
+    shape = pymunk.Segment(body, (0, 20), (0, -20), 5)
+    shape.mass = 1
+    shape.friction = 0.7
+    space.add(body, shape)
+    return body
+
+
+def pin_joint(space, box_offset):
+    b1 = add_ball(space, (50, 60), box_offset)
+    b2 = add_ball(space, (150, 60), box_offset)
+    c = pymunk.PinJoint(b1, b2, (20, 0), (-20, 0))
+    space.add(c)
+    return c
+
+
+def slide_joint(space, box_offset):
+    b1 = add_ball(space, (50, 60), box_offset)
+    b2 = add_ball(space, (150, 60), box_offset)
+    c = pymunk.SlideJoint(b1, b2, (20, 0), (-20, 0), 80, 80)
+    space.add(c)
+    return c
+
+
+def pivot_joint(space, box_offset):
+    b1 = add_ball(space, (50, 60), box_offset)
+    b2 = add_ball(space, (150, 60), box_offset)
+    c = pymunk.PivotJoint(b1, b2, Vec2d(*box_offset) + (100, 60))
+    space.add(c)
+    return c
+
+
+def groove_joint(space, box_offset):
+    b1 = add_ball(space, (50, 60), box_offset)
+    b2 = add_ball(space, (150, 60), box_offset)
+    c = pymunk.GrooveJoint(b1, b2, (50, 50), (50, -50), (-50, 0))
+    space.add(c)
+    return c
+
+
+def damped_spring(space, box_offset):
+    b1 = add_ball(space, (50, 60), box_offset)
+    b2 = add_ball(space, (150, 60), box_offset)
+    c = pymunk.DampedSpring(b1, b2, (30, 0), (-30, 0), 20, 5, 0.3)
+    space.add(c)
+    return c
+
+
+def damped_rotary_spring(space, box_offset):
+    b1 = add_bar(space, (50, 80), box_offset)
+    b2 = add_bar(space, (150, 80), box_offset)
+    # Add some joints to hold the circles in place.
+    space.add(pymunk.PivotJoint(b1, space.static_body, (50, 80) + Vec2d(*box_offset)))
+    space.add(pymunk.PivotJoint(b2, space.static_body, (150, 80) + Vec2d(*box_offset)))
+    c = pymunk.DampedRotarySpring(b1, b2, 0, 3000, 60)
+    space.add(c)
+    return c
+
+
+def rotary_limit_joint(space, box_offset):
+    b1 = add_lever(space, (50, 100), box_offset)
+    b2 = add_lever(space, (150, 100), box_offset)
+    # Add some joints to hold the circles in place.
+    space.add(pymunk.PivotJoint(b1, space.static_body, (50, 100) + Vec2d(*box_offset)))
+    space.add(pymunk.PivotJoint(b2, space.static_body, (150, 100) + Vec2d(*box_offset)))
+    # Hold their rotation within 90 degrees of each other.
+    c = pymunk.RotaryLimitJoint(b1, b2, math.pi / 2, math.pi / 2)
+    space.add(c)
+    return c
+
+
+def ratchet_joint(space, box_offset):
+    b1 = add_lever(space, (50, 100), box_offset)
+    b2 = add_lever(space, (150, 100), box_offset)
+    # Add some pin joints to hold the circles in place.
+    space.add(pymunk.PivotJoint(b1, space.static_body, (50, 100) + Vec2d(*box_offset)))
+    space.add(pymunk.PivotJoint(b2, space.static_body, (150, 100) + Vec2d(*box_offset)))
+    # Ratchet every 90 degrees
+    c = pymunk.RatchetJoint(b1, b2, 0, math.pi / 2)
+    space.add(c)
+    return c
+
+
+def gear_joint(space, box_offset):
+    b1 = add_bar(space, (50, 100), box_offset)
+    b2 = add_bar(space, (150, 100), box_offset)
+    # Add some pin joints to hold the circles in place.
+    space.add(pymunk.PivotJoint(b1, space.static_body, (50, 100) + Vec2d(*box_offset)))
+    space.add(pymunk.PivotJoint(b2, space.static_body, (150, 100) + Vec2d(*box_offset)))
+    # Force one to sping 2x as fast as the other
+    c = pymunk.GearJoint(b1, b2, 0, 2)
+    space.add(c)
+    return c
+
+
+def simple_motor(space, box_offset):
+    b1 = add_bar(space, (50, 100), box_offset)
+    b2 = add_bar(space, (150, 100), box_offset)
+    # Add some pin joints to hold the circles in place.
+    space.add(pymunk.PivotJoint(b1, space.static_body, (50, 100) + Vec2d(*box_offset)))
+    space.add(pymunk.PivotJoint(b2, space.static_body, (150, 100) + Vec2d(*box_offset)))
+    # Make them spin at 1/2 revolution per second in relation to each other.
+    c = pymunk.SimpleMotor(b1, b2, math.pi)
+    space.add(c)
+    return c
+
+
+# In the order of the demo boxes, six per row.
+setups = [
+    ("PinJoint", pin_joint),
+    ("SlideJoint", slide_joint),
+    ("PivotJoint", pivot_joint),
+    ("GrooveJoint", groove_joint),
+    ("DampedSpring", damped_spring),
+    ("DampedRotarySpring", damped_rotary_spring),
+    ("RotaryLimitJoint", rotary_limit_joint),
+    ("RatchetJoint", ratchet_joint),
+    ("GearJoint", gear_joint),
+    ("SimpleMotor", simple_motor),
+]
+
+
+def offset_of(index, columns=6):
+    return box_size * (index % columns), box_size * (index // columns)
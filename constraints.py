@@ -6,7 +6,6 @@ https://github.com/slembcke/Chipmunk2D/blob/master/demo/Joints.c
 """
 
 import inspect
-import math
 
 import pygame
 
@@ -14,6 +13,10 @@ import pymunk
 import pymunk.pygame_util
 from pymunk.vec2d import Vec2d
 
+from constraint_setups import box_size, setups, offset_of
+from regions import RegionWorld
+from drag import DragSystem
+
 pygame.init()
 screen = pygame.display.set_mode((1200, 600))
 clock = pygame.time.Clock()
@@ -31,7 +34,6 @@ space.gravity = (0.0, 900.0)
 draw_options = pymunk.pygame_util.DrawOptions(screen)
 
 # containers
-box_size = 200
 w = screen.get_width()
 h = screen.get_height()
 for i in range(6):
@@ -46,132 +48,25 @@ for i in range(6):
     space.add(sw, sh)
 
 
-def add_ball(space, pos, box_offset):
-    body = pymunk.Body()
-    body.position = Vec2d(*pos) + box_offset
-    shape = pymunk.Circle(body, 20)
-    shape.mass = 1
-    shape.friction = 0.7
-    space.add(body, shape)
-    return body
-
-
-def add_bar(space, pos, box_offset):
-    body = pymunk.Body()
-    body.position = Vec2d(*pos) + box_offset
-    shape = pymunk.Segment(body, (0, 40), (0, -40), 6)
-    shape.mass = 2
-    shape.friction = 0.7
-    space.add(body, shape)
-    return body
-
-
-def add_lever(space, pos, box_offset):
-    body = pymunk.Body()
-    body.position = pos + Vec2d(*box_offset) + (0, -20)
-    shape = pymunk.Segment(body, (0, 20), (0, -20), 5)
-    shape.mass = 1
-    shape.friction = 0.7
-    space.add(body, shape)
-    return body
-
-
 def main():
     txts = {}
 
-    box_offset = 0, 0
-    b1 = add_ball(space, (50, 60), box_offset)
-    b2 = add_ball(space, (150, 60), box_offset)
-    c: pymunk.Constraint = pymunk.PinJoint(b1, b2, (20, 0), (-20, 0))
-    txts[box_offset] = inspect.getdoc(c)
-    space.add(c)
-
-    box_offset = box_size, 0
-    b1 = add_ball(space, (50, 60), box_offset)
-    b2 = add_ball(space, (150, 60), box_offset)
-    c = pymunk.SlideJoint(b1, b2, (20, 0), (-20, 0), 80, 80)
-    txts[box_offset] = inspect.getdoc(c)
-    space.add(c)
-
-    box_offset = box_size * 2, 0
-    b1 = add_ball(space, (50, 60), box_offset)
-    b2 = add_ball(space, (150, 60), box_offset)
-    c = pymunk.PivotJoint(b1, b2, Vec2d(*box_offset) + (100, 60))
-    txts[box_offset] = inspect.getdoc(c)
-    space.add(c)
-
-    box_offset = box_size * 3, 0
-    b1 = add_ball(space, (50, 60), box_offset)
-    b2 = add_ball(space, (150, 60), box_offset)
-    c = pymunk.GrooveJoint(b1, b2, (50, 50), (50, -50), (-50, 0))
-    txts[box_offset] = inspect.getdoc(c)
-    space.add(c)
-
-    box_offset = box_size * 4, 0
-    b1 = add_ball(space, (50, 60), box_offset)
-    b2 = add_ball(space, (150, 60), box_offset)
-    c = pymunk.DampedSpring(b1, b2, (30, 0), (-30, 0), 20, 5, 0.3)
-    txts[box_offset] = inspect.getdoc(c)
-    space.add(c)
-
-    box_offset = box_size * 5, 0
-    b1 = add_bar(space, (50, 80), box_offset)
-    b2 = add_bar(space, (150, 80), box_offset)
-    # Add some joints to hold the circles in place.
-    space.add(pymunk.PivotJoint(b1, space.static_body, (50, 80) + Vec2d(*box_offset)))
-    space.add(pymunk.PivotJoint(b2, space.static_body, (150, 80) + Vec2d(*box_offset)))
-    c = pymunk.DampedRotarySpring(b1, b2, 0, 3000, 60)
-    txts[box_offset] = inspect.getdoc(c)
-    space.add(c)
-
-    box_offset = 0, box_size
-    b1 = add_lever(space, (50, 100), box_offset)
-    b2 = add_lever(space, (150, 100), box_offset)
-    # Add some joints to hold the circles in place.
-    space.add(pymunk.PivotJoint(b1, space.static_body, (50, 100) + Vec2d(*box_offset)))
-    space.add(pymunk.PivotJoint(b2, space.static_body, (150, 100) + Vec2d(*box_offset)))
-    # Hold their rotation within 90 degrees of each other.
-    c = pymunk.RotaryLimitJoint(b1, b2, math.pi / 2, math.pi / 2)
-    txts[box_offset] = inspect.getdoc(c)
-    space.add(c)
-
-    box_offset = box_size, box_size
-    b1 = add_lever(space, (50, 100), box_offset)
-    b2 = add_lever(space, (150, 100), box_offset)
-    # Add some pin joints to hold the circles in place.
-    space.add(pymunk.PivotJoint(b1, space.static_body, (50, 100) + Vec2d(*box_offset)))
-    space.add(pymunk.PivotJoint(b2, space.static_body, (150, 100) + Vec2d(*box_offset)))
-    # Ratchet every 90 degrees
-    c = pymunk.RatchetJoint(b1, b2, 0, math.pi / 2)
-    txts[box_offset] = inspect.getdoc(c)
-    space.add(c)
-
-    box_offset = box_size * 2, box_size
-    b1 = add_bar(space, (50, 100), box_offset)
-    b2 = add_bar(space, (150, 100), box_offset)
-    # Add some pin joints to hold the circles in place.
-    space.add(pymunk.PivotJoint(b1, space.static_body, (50, 100) + Vec2d(*box_offset)))
-    space.add(pymunk.PivotJoint(b2, space.static_body, (150, 100) + Vec2d(*box_offset)))
-    # Force one to sping 2x as fast as the other
-    c = pymunk.GearJoint(b1, b2, 0, 2)
-    txts[box_offset] = inspect.getdoc(c)
-    space.add(c)
-
-    box_offset = box_size * 3, box_size
-    b1 = add_bar(space, (50, 100), box_offset)
-    b2 = add_bar(space, (150, 100), box_offset)
-    # Add some pin joints to hold the circles in place.
-    space.add(pymunk.PivotJoint(b1, space.static_body, (50, 100) + Vec2d(*box_offset)))
-    space.add(pymunk.PivotJoint(b2, space.static_body, (150, 100) + Vec2d(*box_offset)))
-    # Make them spin at 1/2 revolution per second in relation to each other.
-    c = pymunk.SimpleMotor(b1, b2, math.pi)
-    txts[box_offset] = inspect.getdoc(c)
-    space.add(c)
+    for i, (name, setup) in enumerate(setups):
+        box_offset = offset_of(i)
+        c = setup(space, box_offset)
+        txts[box_offset] = inspect.getdoc(c)
+
+    # The boxes never interact, each one gets its own space and they are
+    # stepped in parallel. The strip under them catches what escapes a box.
+    bbs = [pymunk.BB(x, y, x + box_size, y + box_size)
+           for y in range(0, h - box_size, box_size) for x in range(0, w, box_size)]
+    bbs.append(pymunk.BB(0, h - box_size, w, h))
+    world = RegionWorld.split(space, bbs)
 
     # TODO add one or two advanced constraints examples, such as a car or rope
 
-    mouse_joint = None
-    mouse_body = pymunk.Body(body_type=pymunk.Body.KINEMATIC)
+    drag = DragSystem(world)
+    drag.mark_space()
 
     # Build rendered help texts
     box_texts = {}
@@ -186,38 +81,13 @@ def main():
     while True:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                world.close()
                 exit()
             elif event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                world.close()
                 exit()
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                if mouse_joint is not None:
-                    space.remove(mouse_joint)
-                    mouse_joint = None
-
-                p = Vec2d(*event.pos)
-                hit = space.point_query_nearest(p, 5, pymunk.ShapeFilter())
-                if hit is not None and hit.shape.body.body_type == pymunk.Body.DYNAMIC:
-                    shape = hit.shape
-                    # Use the closest point on the surface if the click is outside
-                    # of the shape.
-                    if hit.distance > 0:
-                        nearest = hit.point
-                    else:
-                        nearest = p
-                    mouse_joint = pymunk.PivotJoint(
-                        mouse_body,
-                        shape.body,
-                        (0, 0),
-                        shape.body.world_to_local(nearest),
-                    )
-                    mouse_joint.max_force = 50000
-                    mouse_joint.error_bias = (1 - 0.15) ** 60
-                    space.add(mouse_joint)
-
-            elif event.type == pygame.MOUSEBUTTONUP:
-                if mouse_joint is not None:
-                    space.remove(mouse_joint)
-                    mouse_joint = None
+            else:
+                drag.handle_event(event, screen.get_size())
 
         screen.fill(pygame.Color("white"))
 
@@ -237,15 +107,13 @@ def main():
                 screen.blit(txt, pos)
                 i += 1
 
-        mouse_body.position = mouse_pos
-
-        space.step(1.0 / 60)
+        world.step(1.0 / 60)
 
-        space.debug_draw(draw_options)
+        world.debug_draw(draw_options)
         pygame.display.flip()
 
         clock.tick(60)
-        pygame.display.set_caption(f"fps: {clock.get_fps()}")
+        pygame.display.set_caption(f"fps: {clock.get_fps():.0f}  {world.stats()}  {drag.stats()}")
 
 
 if __name__ == "__main__":
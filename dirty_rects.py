@@ -0,0 +1,115 @@
+"""Dirty rectangle display updates.
+
+Instead of clearing the screen and pushing the whole surface every frame,
+the scene keeps everything that doesn't move in a cached background and
+tells the renderer which rects it drew on:
+
+    dirty.restore()                     # background back over last frame's rects
+    dirty.add(obj.draw(screen))         # pygame.draw and blit return the rect they touched
+    dirty.add_shape(shape)              # or the screen rect of a pymunk shape
+    dirty.present()
+
+present() merges the rects of this frame and of the previous one (where the
+moved objects were) and calls pygame.display.update with them. When the
+merged area goes over full_ratio of the screen a single full flip is cheaper
+and is used instead. invalidate() rebuilds the background with the scene's
+draw_background(surface) and pushes the whole screen on the next present.
+Things drawn with transparency over their own old pixels (like a graph) are
+erased first with erase(rect), touched(rect) tells if restore() cut into
+something that didn't change and has to be drawn again.
+"""
+
+import pygame
+
+
+def merge_rects(rects):
+    #unions overlapping rects until none of the results overlap
+    merged = []
+    for rect in rects:
+        rect = pygame.Rect(rect)
+        i = 0
+        while i < len(merged):
+            if rect.colliderect(merged[i]):
+                rect.union_ip(merged.pop(i))
+                i = 0
+            else:
+                i += 1
+        merged.append(rect)
+    return merged
+
+
+
+class DirtyRenderer:
+    def __init__(self, screen, draw_background, full_ratio=0.5, margin=2):
+        self.screen = screen
+        self.draw_background = draw_background
+        self.full_ratio = full_ratio
+        self.margin = margin
+        self.screen_rect = screen.get_rect()
+        self.background = pygame.Surface(screen.get_size())
+
+        self.previous = []
+        self.current = []
+        self.full_redraw = True
+
+        #stats of the last present
+        self.rect_count = 0
+        self.area_ratio = 1.0
+        self.full_flips = 0
+        self.invalidate()
+
+
+    def invalidate(self):
+        self.draw_background(self.background)
+        self.full_redraw = True
+
+
+    def restore(self):
+        #call before drawing the frame
+        if self.full_redraw:
+            self.screen.blit(self.background, (0, 0))
+        else:
+            for rect in self.previous:
+                self.screen.blit(self.background, rect, rect)
+
+
+    def add(self, rect):
+        if rect is not None:
+            self.current.append(pygame.Rect(rect).inflate(self.margin * 2, self.margin * 2))
+        return rect
+
+    def add_shape(self, shape):
+        bb = shape.bb
+        self.add((bb.left, bb.bottom, bb.right - bb.left, bb.top - bb.bottom))
+
+    def touched(self, rect):
+        #True if restore() put background over part of rect this frame
+        return self.full_redraw or pygame.Rect(rect).collidelist(self.previous) != -1
+
+    def erase(self, rect):
+        #background over a rect now, for things that are drawn over their own old pixels
+        rect = pygame.Rect(rect)
+        self.screen.blit(self.background, rect, rect)
+        self.add(rect)
+
+
+    def present(self):
+        rects = [rect.clip(self.screen_rect) for rect in merge_rects(self.previous + self.current)]
+        rects = [rect for rect in rects if rect.w and rect.h]
+        area = sum(rect.w * rect.h for rect in rects)
+        self.area_ratio = area / (self.screen_rect.w * self.screen_rect.h)
+        self.rect_count = len(rects)
+
+        if self.full_redraw or self.area_ratio > self.full_ratio:
+            pygame.display.flip()
+            self.full_flips += 1
+        elif rects:
+            pygame.display.update(rects)
+
+        self.previous = self.current
+        self.current = []
+        self.full_redraw = False
+
+
+    def stats(self):
+        return f"dirty rects: {self.rect_count}  area: {self.area_ratio * 100:.0f}%  full flips: {self.full_flips}"
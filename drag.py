@@ -0,0 +1,186 @@
+"""Dragging bodies with the mouse or with fingers.
+
+DragSystem keeps one Pointer per pointer id, the mouse and every finger of a
+touch screen, so several bodies can be dragged at the same time. A pointer
+owns a kinematic body that follows it and pulls the grabbed body with a
+PivotJoint. Chipmunk can't change the bodies of a constraint after it's
+made, so a pointer keeps the joints it made in a small cache per grabbed
+body: grabbing the same body again only moves the anchor and puts the joint
+back in the space.
+
+Only dynamic bodies can be grabbed, and that is done by the query itself.
+The system reserves a "draggable" category (CollFilter.reserve), mark() and
+mark_space() put it on the shapes of dynamic bodies, take it off every other
+shape and out of every mask. No mask lists the category, so it never changes
+what collides, and pick() is one point_query_nearest masked on it. Shapes
+made later keep the default filter, which has every category: mark them too.
+Joints of bodies that left their space are dropped from the caches at the
+next press.
+
+The space can be a pymunk.Space or a regions.RegionWorld, the joint goes in
+the space of the grabbed body.
+"""
+
+from collections import OrderedDict
+
+import pygame
+
+import pymunk
+
+from collfilter import CollFilter
+
+
+class Pointer:
+    def __init__(self, system):
+        self.system = system
+        self.body = pymunk.Body(body_type=pymunk.Body.KINEMATIC)
+        #grabbed body -> joint, least recently used first
+        self.joints = OrderedDict()
+        self.joint = None
+        self.joint_space = None
+
+
+    def prune(self):
+        #the cache holds its bodies, the ones removed from their space go
+        for body in [body for body in self.joints if body.space is None]:
+            del self.joints[body]
+
+    def joint_for(self, body, anchor):
+        joint = self.joints.pop(body, None)
+        if joint is None:
+            joint = pymunk.PivotJoint(self.body, body, (0, 0), anchor)
+            joint.max_force = self.system.max_force
+            joint.error_bias = self.system.error_bias
+            self.system.joints_made += 1
+        else:
+            joint.anchor_b = anchor
+            self.system.joints_reused += 1
+        self.joints[body] = joint
+        if len(self.joints) > self.system.cache_size:
+            self.joints.popitem(last=False)
+        return joint
+
+
+    def grab(self, hit, pos):
+        self.release()
+        body = hit.shape.body
+        if body.space is None:
+            return False
+        # Use the closest point on the surface if the click is outside
+        # of the shape.
+        nearest = hit.point if hit.distance > 0 else pos
+        self.body.position = pos
+        self.joint = self.joint_for(body, body.world_to_local(nearest))
+        self.joint_space = body.space
+        self.joint_space.add(self.joint)
+        return True
+
+    def release(self):
+        if self.joint is not None:
+            #the body may have left the space while it was held
+            if self.joint.b.space == self.joint_space:
+                self.joint_space.remove(self.joint)
+            self.joint = None
+            self.joint_space = None
+
+
+
+class DragSystem:
+    def __init__(self, space, radius=5, max_force=50000, error_bias=(1 - 0.15) ** 60, cache_size=16):
+        self.space = space
+        self.radius = radius
+        self.max_force = max_force
+        self.error_bias = error_bias
+        self.cache_size = cache_size
+        self.category = CollFilter.reserve("draggable").category
+        self.query_filter = pymunk.ShapeFilter(mask=self.category)
+        self.pointers = {}
+
+        self.joints_made = 0
+        self.joints_reused = 0
+
+
+    ### Picking
+    def mark(self, *shapes):
+        for shape in shapes:
+            f = shape.filter
+            if shape.body.body_type == pymunk.Body.DYNAMIC:
+                categories = f.categories | self.category
+            else:
+                categories = f.categories & ~self.category
+            mask = f.mask & ~self.category
+            if categories != f.categories or mask != f.mask:
+                shape.filter = pymunk.ShapeFilter(group=f.group, categories=categories, mask=mask)
+
+    def mark_space(self):
+        self.mark(*self.space.shapes)
+
+    def pick(self, pos):
+        #nearest shape of a dynamic body within radius, or None
+        return self.space.point_query_nearest(pos, self.radius, self.query_filter)
+
+
+    ### Pointers
+    def pointer(self, pointer_id):
+        if pointer_id not in self.pointers:
+            self.pointers[pointer_id] = Pointer(self)
+        return self.pointers[pointer_id]
+
+    def press(self, pointer_id, pos):
+        #returns True if a body was grabbed
+        pos = pymunk.Vec2d(*pos)
+        hit = self.pick(pos)
+        pointer = self.pointer(pointer_id)
+        pointer.prune()
+        if hit is None:
+            pointer.release()
+            return False
+        return pointer.grab(hit, pos)
+
+    def move(self, pointer_id, pos):
+        if pointer_id in self.pointers:
+            self.pointers[pointer_id].body.position = pos
+
+    def release(self, pointer_id):
+        if pointer_id in self.pointers:
+            self.pointers[pointer_id].release()
+
+    def release_all(self):
+        for pointer in self.pointers.values():
+            pointer.release()
+
+    @property
+    def dragging(self):
+        return [pointer.joint.b for pointer in self.pointers.values() if pointer.joint is not None]
+
+
+    def handle_event(self, event, size):
+        '''
+        Drives the pointers from pygame events: the left mouse button is pointer "mouse", fingers
+        are pointers by finger_id. size is the screen size, finger positions come normalized.
+        Returns True if the event was a pointer event.
+        '''
+        if getattr(event, "touch", False):
+            #mouse events sdl makes up from a finger, the finger events already move a pointer
+            return False
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            self.press("mouse", event.pos)
+        elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+            self.release("mouse")
+        elif event.type == pygame.MOUSEMOTION:
+            self.move("mouse", event.pos)
+        elif event.type in (pygame.FINGERDOWN, pygame.FINGERMOTION, pygame.FINGERUP):
+            pos = event.x * size[0], event.y * size[1]
+            if event.type == pygame.FINGERDOWN:
+                self.press(event.finger_id, pos)
+            elif event.type == pygame.FINGERMOTION:
+                self.move(event.finger_id, pos)
+            else:
+                self.release(event.finger_id)
+        else:
+            return False
+        return True
+
+
+    def stats(self):
+        return f"dragging: {len(self.dragging)}  joints made: {self.joints_made}  reused: {self.joints_reused}"
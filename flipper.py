@@ -10,6 +10,8 @@ import pymunk
 import pymunk.pygame_util
 from pymunk import Vec2d
 
+from broadphase import BroadphaseAdvisor
+
 
 def main():
     pygame.init()
@@ -82,6 +84,8 @@ def main():
         shape.elasticity = 1.5
         space.add(body, shape)
 
+    advisor = BroadphaseAdvisor(space, dt=1.0 / 60.0 / 5.0)
+
     while running:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -136,6 +140,7 @@ def main():
         dt = 1.0 / 60.0 / 5.0
         for x in range(5):
             space.step(dt)
+        advisor.update()
 
         ### Flip screen
         pygame.display.flip()
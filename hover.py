@@ -0,0 +1,60 @@
+"""Memoized hover/pick query.
+
+The result of point_query_nearest is cached together with the cursor position
+and the step counter of the space. A hit is reused until the cursor moves or
+the hit body moves, falls asleep or wakes up, or the shape leaves the space.
+An empty result is reused until the cursor moves or the space is stepped,
+since a body may have moved under the cursor.
+"""
+
+import pymunk
+
+
+class HoverQuery:
+    def __init__(self, space, radius=10, shape_filter=pymunk.ShapeFilter()):
+        self.space = space
+        self.radius = radius
+        self.shape_filter = shape_filter
+
+        self.steps = 0
+        self.pos = None
+        self.result = None
+        self.key = None
+        self.queries = 0
+        self.cache_hits = 0
+
+
+    def notify_step(self):
+        #call after every space.step
+        self.steps += 1
+
+
+    def body_state(self, result):
+        body = result.shape.body
+        return body.position, body.angle, body.is_sleeping
+
+
+    def is_valid(self, pos):
+        if pos != self.pos or self.key is None:
+            return False
+        if self.result is None:
+            return self.key == self.steps
+        if self.result.shape.space is not self.space:
+            return False
+        return self.key == self.body_state(self.result)
+
+
+    def query(self, pos):
+        pos = tuple(pos)
+        if self.is_valid(pos):
+            self.cache_hits += 1
+            return self.result
+
+        self.queries += 1
+        self.pos = pos
+        self.result = self.space.point_query_nearest(pos, self.radius, self.shape_filter)
+        if self.result is None:
+            self.key = self.steps
+        else:
+            self.key = self.body_state(self.result)
+        return self.result
@@ -0,0 +1,105 @@
+"""Entity lifecycle manager.
+
+Entities are the usual demo objects that add their body/shape to the space in
+their __init__. The manager keeps track of them, and when one is destroyed it
+removes all of its bodies, shapes and constraints from the space and lets the
+entity drop itself from its class registries. Classes can be pooled: destroyed
+instances are kept and handed out again through their reset method instead of
+allocating new bodies and shapes.
+
+Optional entity hooks:
+    physics_objects()   bodies, shapes and constraints owned by the entity
+                        (by default the body, shape and constraints attributes)
+    on_destroy()        drop the entity from the class registries
+    reset(*args)        reinitialize a pooled instance, same args as __init__
+"""
+
+import pymunk
+
+
+class EntityManager:
+    def __init__(self, space):
+        self.space = space
+        self.entities = set()
+        self.pools = {}
+        self.pool_limits = {}
+        self.created = 0
+        self.reused = 0
+        self.destroyed = 0
+
+    def __len__(self):
+        return len(self.entities)
+
+    def __contains__(self, entity):
+        return entity in self.entities
+
+
+    @staticmethod
+    def physics_objects(entity):
+        if hasattr(entity, "physics_objects"):
+            return list(entity.physics_objects())
+
+        objects = []
+        for name in ("body", "shape"):
+            obj = getattr(entity, name, None)
+            if obj is not None:
+                objects.append(obj)
+        objects += getattr(entity, "constraints", [])
+        return objects
+
+
+    def enable_pooling(self, cls, limit=64):
+        self.pools.setdefault(cls, [])
+        self.pool_limits[cls] = limit
+
+    def pooled_count(self, cls=None):
+        if cls is not None:
+            return len(self.pools.get(cls, []))
+        return sum(len(pool) for pool in self.pools.values())
+
+
+    def spawn(self, cls, *args, **kwargs):
+        pool = self.pools.get(cls)
+        if pool:
+            entity = pool.pop()
+            entity.reset(*args, **kwargs)
+            self.space.add(*self.physics_objects(entity))
+            self.reused += 1
+        else:
+            entity = cls(*args, **kwargs)
+            self.created += 1
+        self.entities.add(entity)
+        return entity
+
+
+    def destroy(self, entity):
+        if entity not in self.entities:
+            return
+        self.entities.remove(entity)
+
+        #static bodies are shared (space.static_body) or not always in the space
+        in_space = [obj for obj in self.physics_objects(entity) if self.in_space(obj)]
+        if in_space:
+            self.space.remove(*in_space)
+        if hasattr(entity, "on_destroy"):
+            entity.on_destroy()
+        self.destroyed += 1
+
+        pool = self.pools.get(type(entity))
+        if pool is not None and len(pool) < self.pool_limits[type(entity)]:
+            pool.append(entity)
+
+
+    def destroy_all(self, cls=None):
+        for entity in list(self.entities):
+            if cls is None or isinstance(entity, cls):
+                self.destroy(entity)
+
+
+    def in_space(self, obj):
+        if isinstance(obj, pymunk.Body):
+            return obj is not self.space.static_body and obj.space is self.space
+        if isinstance(obj, pymunk.Shape):
+            return obj.space is self.space
+        #constraints do not know their space, the ones owned by a live entity are always added
+        return True
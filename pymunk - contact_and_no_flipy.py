@@ -11,6 +11,8 @@ import pygame
 import pymunk as pm
 from pymunk import Vec2d
 
+from broadphase import BroadphaseAdvisor
+
 
 def draw_collision(arbiter, space, data):
     for c in arbiter.contact_point_set.points:
@@ -42,6 +44,7 @@ def main():
     space.add(*static_lines)
 
     ticks_to_next_ball = 10
+    advisor = BroadphaseAdvisor(space)
 
     ch = space.add_collision_handler(0, 0)
     ch.data["surface"] = screen
@@ -94,6 +97,7 @@ def main():
         dt = 1.0 / 60.0
         for x in range(1):
             space.step(dt)
+        advisor.update()
 
         ### Flip screen
         pygame.display.flip()
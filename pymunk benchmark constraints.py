@@ -0,0 +1,161 @@
+import argparse, gc, json, math, multiprocessing, os, platform, random, sys, time
+
+import pymunk
+
+from constraint_setups import setups, box_size
+from solver_control import constraint_error, angular_error
+
+
+
+### Benchmark settings
+instance_counts = [10, 100, 1000, 10000, 100000]
+warmup_steps = 10
+steps = 50
+dt = 1.0 / 60.0
+#speed of the seeded kick every rig gets before the run, without it the rigs just fall and nothing is solved
+kick_speed = 300.0
+#the rigs sit in a grid this far apart, so no contact between two rigs is solved: gravity moves them all
+#the same, only the kick brings two rigs closer and it moves a body at most kick_speed * run time
+rig_spacing = box_size + 2 * kick_speed * (warmup_steps + steps) * dt
+#step time over the baseline by more than this is reported as a regression
+regression_ratio = 1.2
+baseline_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "constraints_baseline.json")
+
+
+def motor_error(constraint):
+    #chipmunk drives b.w - a.w to -rate
+    return abs(constraint.b.angular_velocity - constraint.a.angular_velocity + constraint.rate)
+
+#error of each type and its unit, springs are soft and the ratchet has no single target so they have none
+error_funcs = {
+    "PinJoint": (constraint_error, "px"),
+    "SlideJoint": (constraint_error, "px"),
+    "PivotJoint": (constraint_error, "px"),
+    "GrooveJoint": (constraint_error, "px"),
+    "RotaryLimitJoint": (angular_error, "rad"),
+    "GearJoint": (angular_error, "rad"),
+    "SimpleMotor": (motor_error, "rad/s"),
+}
+
+
+def rss():
+    #resident memory, pymunk objects live mostly in chipmunk's C heap where tracemalloc can't see them
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def measure(type_name, instances):
+    #runs in its own process, so the memory of one run doesn't hide in the allocator of the next
+    setup = dict(setups)[type_name]
+    columns = math.ceil(math.sqrt(instances))
+
+    gc.collect()
+    memory_before = rss()
+    started = time.perf_counter()
+    space = pymunk.Space()
+    space.gravity = (0.0, 900.0)
+    constraints = [setup(space, (rig_spacing * (i % columns), rig_spacing * (i // columns))) for i in range(instances)]
+    build_time = time.perf_counter() - started
+
+    kicks = random.Random(instances)
+    for constraint in constraints:
+        constraint.b.velocity = kicks.uniform(-kick_speed, kick_speed), kicks.uniform(-kick_speed, kick_speed)
+        constraint.b.angular_velocity = kicks.uniform(-10.0, 10.0)
+
+    for x in range(warmup_steps):
+        space.step(dt)
+    started = time.perf_counter()
+    for x in range(steps):
+        space.step(dt)
+    step_time = (time.perf_counter() - started) / steps
+    gc.collect()
+    memory = rss() - memory_before
+
+    result = {"type": type_name, "instances": instances,
+              "bodies": len(space.bodies), "constraints": len(space.constraints),
+              "build_ms": build_time * 1000, "step_ms": step_time * 1000,
+              "step_us_per_instance": step_time * 1e6 / instances,
+              "memory_bytes": memory, "bytes_per_instance": memory / instances,
+              "max_error": None, "mean_error": None, "error_unit": None}
+    if type_name in error_funcs:
+        error_func, result["error_unit"] = error_funcs[type_name]
+        errors = [error_func(constraint) for constraint in constraints]
+        result["max_error"] = max(errors)
+        result["mean_error"] = sum(errors) / len(errors)
+
+    #freeing the space unlinks every constraint from its bodies, the pivots of the angular types all hang on the
+    #static body and unlinking them oldest first is quadratic, newest first each one is found at the head
+    space.remove(*reversed(space.constraints))
+    return result
+
+
+def compare(results, baseline):
+    base = {(result["type"], result["instances"]): result for result in baseline["results"]}
+    regressions = 0
+    missing = 0
+    print(f"\n{'type':>18} {'instances':>9} {'step ms':>9} {'baseline':>9} {'ratio':>6}")
+    for result in results:
+        old = base.get((result["type"], result["instances"]))
+        if old is None:
+            missing += 1
+            continue
+        if not old["step_ms"]:
+            continue
+        ratio = result["step_ms"] / old["step_ms"]
+        flag = "  <- slower" if ratio > regression_ratio else ""
+        regressions += bool(flag)
+        print(f"{result['type']:>18} {result['instances']:>9} {result['step_ms']:>9.3f} {old['step_ms']:>9.3f} {ratio:>6.2f}{flag}")
+    if missing:
+        #the baseline may have been made with a smaller --max
+        print(f"{missing} runs not in the baseline (baseline max_instances: {baseline['meta'].get('max_instances', 'unknown')})")
+    return regressions
+
+
+
+### Run
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Step time, memory and error per constraint type.")
+    parser.add_argument("types", nargs="*", help="constraint types to run, all by default")
+    parser.add_argument("--max", type=int, default=instance_counts[-1], help="largest instance count")
+    parser.add_argument("--out", help="write the results as JSON")
+    parser.add_argument("--baseline", default=baseline_path, help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    args = parser.parse_args()
+
+    type_names = args.types or [name for name, setup in setups]
+    for type_name in type_names:
+        if type_name not in dict(setups):
+            sys.exit(f"{type_name} is not a constraint type, use one of {[name for name, setup in setups]}.")
+
+    results = []
+    print(f"{'type':>18} {'instances':>9} {'build ms':>9} {'step ms':>9} {'us/inst':>8} {'KB/inst':>8} {'max error':>10} {'mean error':>10}")
+    #one fresh process per run, spawned so it doesn't inherit the memory of the parent
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        for type_name in type_names:
+            for instances in [count for count in instance_counts if count <= args.max]:
+                result = pool.apply(measure, (type_name, instances))
+                results.append(result)
+                error = f"{result['max_error']:>10.4f} {result['mean_error']:>10.4f} {result['error_unit']}" if result["error_unit"] else f"{'-':>10} {'-':>10}"
+                print(f"{type_name:>18} {instances:>9} {result['build_ms']:>9.1f} {result['step_ms']:>9.3f} "
+                      f"{result['step_us_per_instance']:>8.2f} {result['bytes_per_instance'] / 1024:>8.2f} {error}")
+
+    report = {"meta": {"pymunk": pymunk.version, "python": platform.python_version(), "platform": platform.platform(),
+                       "date": time.strftime("%Y-%m-%d %H:%M:%S"), "steps": steps, "warmup_steps": warmup_steps, "dt": dt,
+                       "kick_speed": kick_speed, "rig_spacing": rig_spacing, "max_instances": args.max},
+              "results": results}
+    if args.out:
+        with open(args.out, "w") as out_file:
+            json.dump(report, out_file, indent=1)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as out_file:
+            json.dump(report, out_file, indent=1)
+        print(f"\nbaseline written to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file))
+        print(f"\n{regressions} runs slower than {regression_ratio}x the baseline")
@@ -0,0 +1,79 @@
+import sys, time
+
+import pygame
+
+import pymunk
+from pymunk import Vec2d
+
+from rope import Rope, add_ropes
+from rope_render import RopeRenderer
+
+
+
+### Benchmark settings
+link_counts = [10, 50, 100, 250, 500, 1000, 2000]
+rope_counts = [1, 10]
+warmup_steps = 10
+steps = 100
+dt = 1.0 / 60.0
+#rendering goes to an offscreen surface, no window needed
+surface = pygame.Surface((800, 800))
+
+
+def build_scene(recipe, links, ropes):
+    #ropes hanging side by side, the links of every rope are spread over the same 700 pixel span
+    space = pymunk.Space()
+    space.gravity = Vec2d(0.0, 900.0)
+    radius = max(1, 350 // links)
+    all_ropes = []
+    for i in range(ropes):
+        y = 100 + i * 60
+        start = pymunk.Body(body_type=pymunk.Body.STATIC)
+        end = pymunk.Body(body_type=pymunk.Body.STATIC)
+        start.position = 50, y
+        end.position = 750, y
+        all_ropes.append(Rope([start.position, end.position], links // ropes, recipe, radius, 1, i + 1, start, end))
+
+    started = time.perf_counter()
+    add_ropes(space, all_ropes)
+    add_time = time.perf_counter() - started
+    return space, all_ropes, add_time
+
+
+def measure(recipe, links, ropes):
+    started = time.perf_counter()
+    space, all_ropes, add_time = build_scene(recipe, links, ropes)
+    build_time = time.perf_counter() - started
+
+    for x in range(warmup_steps):
+        space.step(dt)
+    started = time.perf_counter()
+    for x in range(steps):
+        space.step(dt)
+    step_time = (time.perf_counter() - started) / steps
+
+    renderer = RopeRenderer(surface, space, all_ropes, (20, 110, 240))
+    started = time.perf_counter()
+    for x in range(steps):
+        renderer.draw()
+    render_time = (time.perf_counter() - started) / steps
+
+    return {"recipe": recipe, "links": links, "ropes": ropes,
+            "bodies": len(space.bodies), "constraints": len(space.constraints),
+            "build_ms": build_time * 1000, "add_ms": add_time * 1000, "step_ms": step_time * 1000, "render_ms": render_time * 1000}
+
+
+
+### Run
+if __name__ == "__main__":
+    recipes = sys.argv[1:] or Rope.recipes
+    print(f"{'recipe':>8} {'links':>6} {'ropes':>5} {'bodies':>7} {'constr':>7} {'build ms':>9} {'add ms':>8} {'step ms':>8} {'us/link':>8} {'draw ms':>8}")
+    for recipe in recipes:
+        for ropes in rope_counts:
+            for links in link_counts:
+                if links < ropes:
+                    continue
+                result = measure(recipe, links, ropes)
+                print(f"{recipe:>8} {links:>6} {ropes:>5} {result['bodies']:>7} {result['constraints']:>7} "
+                      f"{result['build_ms']:>9.2f} {result['add_ms']:>8.2f} {result['step_ms']:>8.3f} "
+                      f"{result['step_ms'] * 1000 / links:>8.2f} {result['render_ms']:>8.3f}")
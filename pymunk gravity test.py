@@ -6,6 +6,9 @@ import pymunk
 import pymunk.pygame_util
 from pymunk import Vec2d
 
+from lifecycle import EntityManager
+from registry import ShapeRegistry
+
 pygame.init()
 
 
@@ -15,8 +18,10 @@ class Obj:
     sun = None
     screen = None
     space = None
+    entities = None
 
     G = 50000
+    collision_type = 1
     
     def __init__(self, x, y, mass, radius=20, color=(210, 200, 200)):
         Obj.all_objs.append(self)
@@ -25,9 +30,92 @@ class Obj:
         self.body.position = x, y
         self.shape = pymunk.Circle(self.body, radius, Vec2d(0, 0))
         self.shape.color = pygame.Color(color)
+        self.shape.collision_type = Obj.collision_type
+        ShapeRegistry.register(self, self.shape, self.body)
         Obj.space.add(self.body, self.shape)
 
 
+    def absorb(self, others):
+        #the surviving body is reused: mass, momentum and area of the others are added to it
+        mass = self.body.mass
+        momentum = self.body.velocity * mass
+        center = self.body.position * mass
+        area = self.shape.radius ** 2
+        for other in others:
+            mass += other.body.mass
+            momentum += other.body.velocity * other.body.mass
+            center += other.body.position * other.body.mass
+            area += other.shape.radius ** 2
+            Obj.entities.destroy(other)
+
+        radius = math.sqrt(area)
+        self.shape.unsafe_set_radius(radius)
+        self.body.mass = mass
+        self.body.moment = pymunk.moment_for_circle(mass, 0, radius, (0, 0))
+        self.body.velocity = momentum / mass
+        if self is not Obj.sun:
+            self.body.position = center / mass
+        Obj.space.reindex_shapes_for_body(self.body)
+
+
+    def on_destroy(self):
+        Obj.all_objs.remove(self)
+        if self in Planet.all_planets:
+            Planet.all_planets.remove(self)
+
+
+
+class Accretion:
+    #touching objects are collected during the step and merged in one batch after it
+    enabled = True
+    pending = []
+
+    @classmethod
+    def setup(cls, space):
+        cls.pending = []
+        handler = space.add_collision_handler(Obj.collision_type, Obj.collision_type)
+        handler.begin = cls.coll_func
+
+    @staticmethod
+    def coll_func(arbiter, space, data):
+        if Accretion.enabled:
+            Accretion.pending.append((ShapeRegistry.owner(arbiter.shapes[0]), ShapeRegistry.owner(arbiter.shapes[1])))
+        return True
+
+    @staticmethod
+    def find(groups, obj):
+        while groups[obj] is not obj:
+            groups[obj] = groups[groups[obj]]
+            obj = groups[obj]
+        return obj
+
+    @classmethod
+    def apply(cls):
+        if not cls.pending:
+            return
+
+        groups = {}
+        for obj_a, obj_b in cls.pending:
+            groups.setdefault(obj_a, obj_a)
+            groups.setdefault(obj_b, obj_b)
+            root_a = cls.find(groups, obj_a)
+            root_b = cls.find(groups, obj_b)
+            if root_a is not root_b:
+                groups[root_b] = root_a
+        cls.pending = []
+
+        merges = {}
+        for obj in groups:
+            merges.setdefault(cls.find(groups, obj), []).append(obj)
+
+        for members in merges.values():
+            if Obj.sun in members:
+                survivor = Obj.sun
+            else:
+                survivor = max(members, key=lambda obj: obj.body.mass)
+            survivor.absorb([obj for obj in members if obj is not survivor])
+
+
 class Sun(Obj):
     def __init__(self):
         screen_size = Obj.screen.get_size()
@@ -54,6 +142,18 @@ class Planet(Obj):
         return Vec2d(-gravity_module * math.cos(angle), gravity_module * math.sin(angle))
 
 
+class Debris(Planet):
+    def __init__(self):
+        screen_size = Obj.screen.get_size()
+        Planet.all_planets.append(self)
+        angle = random.uniform(0, math.pi * 2)
+        distance = random.uniform(120, 450)
+        offset = Vec2d(distance * math.cos(angle), distance * math.sin(angle))
+        Obj.__init__(self, screen_size[0] // 2 + offset.x, screen_size[1] // 2 + offset.y, 0.000001, 3, (140, 140, 150))
+        orbit_speed = math.sqrt(Obj.G * Obj.sun.body.mass / distance)
+        self.body.velocity = offset.perpendicular_normal() * orbit_speed * random.uniform(0.8, 1.1)
+
+
 
 def main():
     screen = pygame.display.set_mode((1300, 1000))
@@ -64,14 +164,18 @@ def main():
     ### Physics stuff
     space = pymunk.Space()
     Obj.space = space
+    Obj.entities = EntityManager(space)
     space.gravity = Vec2d(0.0, 0.0)
     draw_options = pymunk.pygame_util.DrawOptions(screen)
+    Accretion.setup(space)
 
 
     ### Object istances
-    Sun()
+    Obj.all_objs = []
+    Planet.all_planets = []
+    Obj.entities.spawn(Sun)
     for i in range(3):
-        Planet(i)
+        Obj.entities.spawn(Planet, i)
 
 
 
@@ -84,6 +188,11 @@ def main():
                 run = False
                 pygame.quit()
                 return True
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_d:
+                for i in range(200):
+                    Obj.entities.spawn(Debris)
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_a:
+                Accretion.enabled = not Accretion.enabled
 
         ### Clear screen
         screen.fill((30, 30, 40))
@@ -100,11 +209,12 @@ def main():
         dt = 1.0 / 60.0
         for x in range(1):
             space.step(dt)
+            Accretion.apply()
 
         ### Flip screen
         pygame.display.update()
         clock.tick(50)
-        pygame.display.set_caption("fps: " + str(clock.get_fps()))
+        pygame.display.set_caption("fps: " + str(clock.get_fps()) + "   bodies: " + str(len(Obj.all_objs)) + "   accretion: " + str(Accretion.enabled))
 
     pygame.quit()
     return False
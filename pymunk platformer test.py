@@ -1,4 +1,4 @@
-import math
+import math, os, json
 
 import pygame
 
@@ -6,44 +6,75 @@ import pymunk
 import pymunk.pygame_util
 from pymunk import Vec2d
 
+from segment_merge import merge_collinear, measure_broadphase
+from lifecycle import EntityManager
+from rollback import RollbackSession, LoopbackTransport
+
 
 
 pygame.init()
 screen = pygame.display.set_mode((800, 800))
-pm_surf = pygame.Surface((1000, 1000))
 clock = pygame.time.Clock()
-camera = (-100, -100)
+camera = Vec2d(-100, -100)
 run = True
+NETPLAY = False
+#prints how much every loaded chunk gains from the segment merge
+REPORT_GEOMETRY = False
 
 ### Physics stuff
 space = pymunk.Space()
 space.gravity = Vec2d(0.0, 10000.0)
 draw_options = pymunk.pygame_util.DrawOptions(screen)
-
-collhandler = space.add_collision_handler(0, 0)
-collhandler.data["surface"] = screen
+entities = EntityManager(space)
 
 
 
 ### Object definition
 class Player:
     limits = {"x":(-1000, 1800), "y":(-1000, 1800)}
+    collision_type = 1
+    ground_normal_y = 0.5
+    wall_normal_x = 0.7
+    controls = {"left": pygame.K_LEFT, "right": pygame.K_RIGHT, "jump": pygame.K_SPACE}
     
     def __init__(self, coords, mass, size):
+        self.reset_state()
+        self.build_body(mass, size)
+        self.body.position = Vec2d(*coords)
+        space.add(self.body, self.shape)
+
+
+    def reset_state(self):
         self.direction = 0
         self.is_touching_ground = True
+        self.is_touching_wall = False
         self.is_climbing = False
         self.jump = False
         self.ground_shape = None
+        self.ground_normal = Vec2d(0.0, 0.0)
+
 
+    def build_body(self, mass, size):
         self.size = size
         points = [(-size, -size), (-size, size), (size, size), (size, -size)]
         moment = pymunk.moment_for_poly(mass, points)
         self.body = pymunk.Body(mass, moment)
-        self.body.position = Vec2d(*coords)
         self.shape = pymunk.Poly(self.body, points, radius=2)
         self.shape.friction = 0.6
-        space.add(self.body, self.shape)
+        self.shape.collision_type = Player.collision_type
+
+
+    def reset(self, coords, mass, size):
+        #called by the entity manager when a pooled player is respawned
+        self.reset_state()
+        if size != self.size or mass != self.body.mass:
+            self.build_body(mass, size)
+        self.body.position = Vec2d(*coords)
+        self.body.velocity = Vec2d(0.0, 0.0)
+        self.body.angular_velocity = 0
+        self.body.angle = 0
+        self.body.force = Vec2d(0.0, 0.0)
+        self.body.torque = 0
 
 
     def is_over_limits(self):
@@ -67,43 +98,67 @@ class Player:
         self.body.apply_force_at_world_point(force, vertice_pos)
 
 
-    def process_coll_points(self, arbiter, status):
-        if status == "pre solve":
-            points = arbiter.contact_point_set.points
-            if len(points) == 2:
-                point_0a_below = points[0].point_a.y >= self.body.position.y
-                point_0b_below = points[1].point_b.y >= self.body.position.y
-                point_1a_below = points[1].point_a.y >= self.body.position.y
-                point_1b_below = points[1].point_b.y >= self.body.position.y
-                if point_0a_below and point_0b_below and point_1a_below and point_1b_below:
-                    self.is_touching_ground = True
-                    if arbiter.shapes[0] == player:
-                        self.ground_shape = arbiter.shapes[1]
-                    else:
-                        self.ground_shape = arbiter.shapes[0]
-        
-        elif status == "exit":
-            if self.ground_shape in arbiter.shapes:
-                self.ground_shape = None
-                self.is_touching_ground = False
+    def update_contact_state(self):
+        #called once after space.step, the result is cached until the next step
+        self.is_touching_ground = False
+        self.is_touching_wall = False
+        self.is_climbing = False
+        self.ground_shape = None
+        self.ground_normal = Vec2d(0.0, 0.0)
+        self.body.each_arbiter(self.process_arbiter)
+
+
+    def process_arbiter(self, arbiter):
+        #the player shape is always the first one, so the normal points from the player to the other shape
+        normal = arbiter.normal
+        other = arbiter.shapes[1]
+        if normal.y >= Player.ground_normal_y:
+            if self.ground_shape is None or normal.y > self.ground_normal.y:
+                self.ground_shape = other
+                self.ground_normal = normal
+            self.is_touching_ground = True
+        elif abs(normal.x) >= Player.wall_normal_x:
+            self.is_touching_wall = True
+
+        if other.collision_type == ClimbPlatform.collision_type:
+            self.is_climbing = True
 
 
     def event_update(self, event):
         keys = pygame.key.get_pressed()
-        if keys[pygame.K_RIGHT] and keys[pygame.K_LEFT]:
+        if keys[self.controls["right"]] and keys[self.controls["left"]]:
             self.direction = 0
-        elif keys[pygame.K_RIGHT]:
+        elif keys[self.controls["right"]]:
             self.direction = 1
-        elif keys[pygame.K_LEFT]:
+        elif keys[self.controls["left"]]:
             self.direction = -1
         else:
             self.direction = 0
 
         if event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_SPACE:
+            if event.key == self.controls["jump"]:
                 self.jump = True
 
 
+    def get_input(self):
+        #the jump is consumed, so the same keypress isn't sent twice
+        player_input = (self.direction, self.jump)
+        self.jump = False
+        return player_input
+
+    def set_input(self, player_input):
+        self.direction, self.jump = player_input
+
+
+    def get_state(self):
+        return (self.direction, self.jump, self.is_touching_ground, self.is_touching_wall,
+                self.is_climbing, self.ground_shape, self.ground_normal)
+
+    def set_state(self, state):
+        (self.direction, self.jump, self.is_touching_ground, self.is_touching_wall,
+         self.is_climbing, self.ground_shape, self.ground_normal) = state
+
+
     def update(self):
         if self.jump:
             self.jump = False
@@ -123,110 +178,227 @@ class Player:
 class Platform:
     all_platforms = []
     radius = 20
+    collision_type = 2
 
     @classmethod
     def all(cls):
         for platform in cls.all_platforms:
             yield platform
     
-    def __init__(self, point_a, point_b):
+    def __init__(self, point_a, point_b, radius=None):
         Platform.all_platforms.append(self)
+        if radius is None:
+            radius = Platform.radius
         self.body = pymunk.Body(10, body_type=pymunk.Body.STATIC)
-        self.shape = pymunk.Segment(self.body, point_a, point_b, Platform.radius)
+        self.shape = pymunk.Segment(self.body, point_a, point_b, radius)
         self.shape.friction = 0.5
+        self.shape.collision_type = type(self).collision_type
         space.add(self.body, self.shape)
 
+    def reset(self, point_a, point_b, radius=None):
+        #the shape is out of the space while pooled, so it can be reshaped in place
+        Platform.all_platforms.append(self)
+        if radius is None:
+            radius = Platform.radius
+        self.shape.unsafe_set_endpoints(point_a, point_b)
+        self.shape.unsafe_set_radius(radius)
+
+    def on_destroy(self):
+        Platform.all_platforms.remove(self)
+
 
 class ClimbPlatform(Platform):
     all_climb_platforms = []
+    collision_type = 3
 
     @classmethod
     def all(cls):
         for platform in cls.all_climb_platforms:
             yield platform
     
-    def __init__(self, point_a, point_b):
+    def __init__(self, point_a, point_b, radius=None):
         ClimbPlatform.all_climb_platforms.append(self)
-        super().__init__(point_a, point_b)
+        super().__init__(point_a, point_b, radius)
         self.shape.color = pygame.Color(200, 170, 120)
         self.shape.friction = 0.6
-            
 
+    def reset(self, point_a, point_b, radius=None):
+        ClimbPlatform.all_climb_platforms.append(self)
+        super().reset(point_a, point_b, radius)
 
+    def on_destroy(self):
+        super().on_destroy()
+        ClimbPlatform.all_climb_platforms.remove(self)
 
-### Object creation
-player = Player((400, 400), 50, 20)
 
-floor = pymunk.Segment(space.static_body, Vec2d(-100, 800), Vec2d(900, 800), 50.0)
-floor.friction = 0.5
-space.add(floor)
 
+class Chunk:
+    '''
+    A square piece of the level. Its platforms only exist in the space while the chunk is loaded.
+    '''
 
-Platform(Vec2d(300, 200), Vec2d(600, 200))
-Platform(Vec2d(50, 400), Vec2d(200, 400))
-Platform(Vec2d(150, 600), Vec2d(300, 600))
-Platform(Vec2d(450, 200), Vec2d(450, 600))
-ClimbPlatform(Vec2d(700, 100), Vec2d(700, 600))
+    def __init__(self, coords):
+        self.coords = coords
+        self.platforms = []
 
+    def load(self, data):
+        #collinear touching pieces of the same kind (e.g. floor tiles) become a single platform
+        segments = [(platform_data["a"], platform_data["b"], (platform_data.get("climb", False), platform_data.get("radius")))
+                    for platform_data in data["platforms"]]
+        merged = merge_collinear(segments)
+        if REPORT_GEOMETRY and segments:
+            self.report(segments, merged)
 
+        for point_a, point_b, (climb, radius) in merged:
+            if climb:
+                platform_class = ClimbPlatform
+            else:
+                platform_class = Platform
+            self.platforms.append(entities.spawn(platform_class, point_a, point_b, radius))
 
-### Setup
-def enter_coll_func(arbiter, space, data):
-    global player
+    def report(self, segments, merged):
+        #broadphase time of the raw and of the merged platforms, each in a throwaway space
+        times = []
+        for pieces in (segments, merged):
+            test_space = pymunk.Space()
+            test_space.add(*[pymunk.Segment(test_space.static_body, point_a, point_b, radius or Platform.radius)
+                             for point_a, point_b, (climb, radius) in pieces])
+            times.append(measure_broadphase(test_space))
+        print(f"chunk {self.coords}: {len(segments)} -> {len(merged)} platforms, broadphase {times[0]:.2f} ms -> {times[1]:.2f} ms")
 
-    if player.shape in arbiter.shapes:
-        for shape in arbiter.shapes:
-            if shape is player:
-                continue
-            else:
-                climb_shapes = [platform.shape for platform in ClimbPlatform.all()]
-                if shape in climb_shapes:
-                    player.is_climbing = True
-                break
-        
-    return True
+    def unload(self):
+        for platform in self.platforms:
+            entities.destroy(platform)
+        self.platforms = []
 
-def exit_coll_func(arbiter, space, data):
-    global player
 
-    if player.shape in arbiter.shapes:
-        player.process_coll_points(arbiter, "exit")
 
-    if player.shape in arbiter.shapes:
-        for shape in arbiter.shapes:
-            if shape is player:
-                continue
-            else:
-                climb_shapes = [platform.shape for platform in ClimbPlatform.all()]
-                if shape in climb_shapes:
-                    player.is_climbing = False
-                break
-        
-    return True
+class World:
+    '''
+    Streams the level chunks from disk, only the chunks around the camera are kept in the space.
+    '''
+
+    level_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "levels", "platformer")
+    chunk_size = 800
+    load_radius = 1
+    unload_radius = 2
+    loaded_chunks = {}
+
+    @classmethod
+    def chunk_coords(cls, pos):
+        return int(pos[0] // cls.chunk_size), int(pos[1] // cls.chunk_size)
+
+    @classmethod
+    def chunk_path(cls, coords):
+        return os.path.join(cls.level_dir, f"chunk_{coords[0]}_{coords[1]}.json")
+
+    @classmethod
+    def read_chunk(cls, coords):
+        path = cls.chunk_path(coords)
+        if not os.path.exists(path):
+            return {"platforms": []}
+        with open(path) as chunk_file:
+            return json.load(chunk_file)
+
+    @classmethod
+    def save_level(cls, platforms_data):
+        #partitions the platforms by the chunk of their middle point and writes one file per chunk
+        chunks = {}
+        for platform_data in platforms_data:
+            middle = (Vec2d(*platform_data["a"]) + Vec2d(*platform_data["b"])) / 2
+            chunks.setdefault(cls.chunk_coords(middle), []).append(platform_data)
+
+        os.makedirs(cls.level_dir, exist_ok=True)
+        for coords, chunk_platforms in chunks.items():
+            with open(cls.chunk_path(coords), "w") as chunk_file:
+                json.dump({"platforms": chunk_platforms}, chunk_file, indent=4)
+
+    @classmethod
+    def update(cls, center):
+        cx, cy = cls.chunk_coords(center)
+
+        for coords in list(cls.loaded_chunks.keys()):
+            if abs(coords[0] - cx) > cls.unload_radius or abs(coords[1] - cy) > cls.unload_radius:
+                cls.loaded_chunks.pop(coords).unload()
+
+        for x in range(cx - cls.load_radius, cx + cls.load_radius + 1):
+            for y in range(cy - cls.load_radius, cy + cls.load_radius + 1):
+                if (x, y) not in cls.loaded_chunks:
+                    chunk = Chunk((x, y))
+                    chunk.load(cls.read_chunk((x, y)))
+                    cls.loaded_chunks[(x, y)] = chunk
+
+
+
+### Object creation
+entities.enable_pooling(Player, 2)
+entities.enable_pooling(Platform, 256)
+entities.enable_pooling(ClimbPlatform, 64)
 
+spawn_points = [(400, 400), (250, 300)]
+remote_controls = {"left": pygame.K_a, "right": pygame.K_d, "jump": pygame.K_w}
 
-def pre_coll_func(arbiter, space, data):
-    if player.shape in arbiter.shapes:
-        player.process_coll_points(arbiter, "pre solve")
-    return True
+player = entities.spawn(Player, spawn_points[0], 50, 20)
+players = [player]
+if NETPLAY:
+    players.append(entities.spawn(Player, spawn_points[1], 50, 20))
+    players[1].controls = remote_controls
+World.update(player.body.position)
 
-collhandler.begin = enter_coll_func
-collhandler.pre_solve = pre_coll_func
-collhandler.separate = exit_coll_func
 
 
+### Setup
 def respawn_player():
     global player
     if player == None:
-        player = Player((400, 400), 50, 20)
+        player = entities.spawn(Player, spawn_points[0], 50, 20)
+        players[0] = player
 
             
 def remove_player_if_out():
     global player
     if player:
         if player.is_over_limits():
+            entities.destroy(player)
             player = None
             respawn_player()
+            if session:
+                session.reset_history()
+
+    for i in range(1, len(players)):
+        if players[i].is_over_limits():
+            entities.destroy(players[i])
+            players[i] = entities.spawn(Player, spawn_points[i], 50, 20)
+            players[i].controls = remote_controls
+            if session:
+                session.reset_history()
+
+
+def step_players():
+    for p in players:
+        p.update()
+
+    dt = 1.0 / 60.0
+    for x in range(1):
+        space.step(dt)
+
+    for p in players:
+        p.update_contact_state()
+
+
+def step_players_with_inputs(inputs):
+    for p, player_input in zip(players, inputs):
+        p.set_input(player_input)
+    step_players()
+
+
+#with NETPLAY the second player stands for a remote one: its inputs (WASD) go through
+#a loopback transport with a delay, and are predicted until they arrive
+session = None
+transport = None
+if NETPLAY:
+    session = RollbackSession(space, players, step_players_with_inputs)
+    transport = LoopbackTransport(delay=6)
         
 
 
@@ -237,32 +409,45 @@ while run:
         if event.type == pygame.QUIT:
             run = False
 
-        if player:
-            player.event_update(event)
+        for p in players:
+            p.event_update(event)
 
 
     ### Update objects
     remove_player_if_out()
+
+    ### Stream the world around the camera
     if player:
-        player.update()
+        camera = player.body.position - Vec2d(*screen.get_size()) / 2
+    World.update(camera + Vec2d(*screen.get_size()) / 2)
 
     ### Clear screen
     screen.fill((30, 30, 40))
 
     ### Draw stuff
+    draw_options.transform = pymunk.Transform.translation(-camera.x, -camera.y)
     space.debug_draw(draw_options)
 
     pg_mouse_pos = pygame.mouse.get_pos()
-    pm_mouse_pos = pymunk.pygame_util.get_mouse_pos(screen)
+    pm_mouse_pos = camera + pymunk.pygame_util.get_mouse_pos(screen)
 
     ### Update physics
-    dt = 1.0 / 60.0
-    for x in range(1):
-        space.step(dt)
+    if session:
+        session.add_local_input(0, player.get_input())
+        for i in range(1, len(players)):
+            transport.send(i, session.frame, players[i].get_input())
+        for player_id, frame, player_input in transport.receive(session.frame):
+            session.add_remote_input(player_id, frame, player_input)
+        session.advance()
+    else:
+        step_players()
 
     ### Flip screen
     pygame.display.update()
     clock.tick(50)
-    pygame.display.set_caption("pymunk test 6" + " "*30 + "fps: " + str(clock.get_fps()))
+    caption = "pymunk test 6" + " "*30 + "fps: " + str(clock.get_fps())
+    if session:
+        caption += "   " + session.stats()
+    pygame.display.set_caption(caption)
 
 pygame.quit()
@@ -7,6 +7,8 @@ from pymunk import Vec2d
 
 import lilgamelib as lgl
 
+from solver_control import IterationController
+
 pygame.init()
 
 
@@ -404,7 +406,6 @@ pause = False
 
 space = pm.Space()
 space.gravity = 0, 9810
-space.iterations = 30
 
 ground_body = space.static_body
 ground = pymunk.Segment(ground_body, (0, lgl.WINDOW.get_size()[1]), (lgl.WINDOW.get_size()[0], lgl.WINDOW.get_size()[1]), 6)
@@ -415,6 +416,9 @@ ball = Ball((100,100), 1, 50)
 ball.control()
 
 box = Box((300, 100), 4, 100)
+#iterations follow the contact penetration of the ball and the box instead of a fixed 30
+solver = IterationController(space, target_error=1.0, min_iterations=5, max_iterations=30, measure_contacts=True,
+                             bodies=[ball.body, box.body])
 
 ice_platform = Platform((150, 400), 300, 10, "ice")
 wood_platform = MovingPlatform((800, 600), 200, Vec2d(700, 500), Vec2d(850, 650))
@@ -430,7 +434,9 @@ lgl.debug.DebugWin.display.append(lgl.debug.DebugVariableDisplay("round(wood_pla
 lgl.debug.DebugWin.display[-1].margin["bottom"] += 20
 lgl.debug.DebugWin.display.append(lgl.debug.DebugVariableDisplay("ball._is_agent", {"ball":ball}))
 lgl.debug.DebugWin.display.append(lgl.debug.DebugVariableDisplay("box._is_agent", {"box":box}))
-lgl.debug.DebugWin.display[-1].margin["bottom"] += 60
+lgl.debug.DebugWin.display[-1].margin["bottom"] += 20
+lgl.debug.DebugWin.display.append(lgl.debug.DebugVariableDisplay("solver.stats()", {"solver":solver}))
+lgl.debug.DebugWin.display[-1].margin["bottom"] += 40
 #lgl.debug.DebugWin.display.append(lgl.debug.DebugSlider((200,600), "scrollbar.height", {"scrollbar":my_scrollbar.scrollbar}))
 lgl.debug.DebugWin.setup((600, lgl.WINDOW.get_size()[1]))
 
@@ -472,6 +478,7 @@ def fixed_update():
         box.fixed_update()
         Platform.fixed_update_all()
         space.step(lgl.MainLoop.fix_update_time)
+        solver.update()
 
 
 def updateGFX():
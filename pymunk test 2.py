@@ -14,6 +14,8 @@ import pymunk
 import pymunk.pygame_util
 from pymunk import Vec2d
 
+from hover import HoverQuery
+
 
 def main():
     pygame.init()
@@ -36,6 +38,7 @@ def main():
     space.add(*static_lines)
 
     ticks_to_next_ball = 10
+    hover = HoverQuery(space, 10)
 
     while running:
         for event in pygame.event.get():
@@ -77,7 +80,7 @@ def main():
 
         mouse_pos = pymunk.pygame_util.get_mouse_pos(screen)
         
-        query_res = space.point_query_nearest(mouse_pos, 10, pymunk.ShapeFilter())
+        query_res = hover.query(mouse_pos)
         if query_res is not None:
             shape = query_res.shape
             if shape is not None and isinstance(shape, pymunk.Circle):
@@ -89,6 +92,7 @@ def main():
         dt = 1.0 / 60.0
         for x in range(1):
             space.step(dt)
+            hover.notify_step()
 
         ### Flip screen
         pygame.display.flip()
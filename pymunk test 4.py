@@ -6,6 +6,13 @@ import pymunk
 import pymunk.pygame_util
 from pymunk import Vec2d
 
+from hover import HoverQuery
+from registry import ShapeRegistry
+from collfilter import CollFilter, CollFilterMask
+from ray_sensors import RaySensor
+from sleep import SleepTracker, SleepLayer
+from dirty_rects import DirtyRenderer
+
 
 
 pygame.init()
@@ -17,35 +24,24 @@ run = True
 space = pymunk.Space()
 space.gravity = Vec2d(0.0, 0.0)
 draw_options = pymunk.pygame_util.DrawOptions(screen)
+#no gravity, so the idle speed has to be given: objects nobody pushes fall asleep
+sleep = SleepTracker(space, idle_time=0.5, idle_speed=5)
+#the nearest object anywhere on the screen, bounded by the screen diagonal instead of an infinite radius
+hover = HoverQuery(space, math.hypot(*screen.get_size()))
+sensor = RaySensor(space)
+sensor_rays = 64
+sensor_range = 400
 
 
 ### Object creation
-class CollFilter:
-    cur_index = "0b1"
-    all_filters = {}
-    
-    def __init__(self, name):
-        self.name = name
-        if name in CollFilter.all_filters.keys():
-            raise Exception(f"{name} is already a filter.")
-        CollFilter.all_filters[name] = self
-        self.filter = pymunk.ShapeFilter(categories=eval(CollFilter.cur_index))
-        CollFilter.cur_index += "0"
-
-    @classmethod
-    def get(cls, name):
-        return cls.all_filters[name]
-
-
 class Obj:
     mass = 10
+    outline_col = pygame.Color(44, 62, 80)
     all_objs = []
 
     @staticmethod
     def find_by_shape(shape):
-        for obj in Obj.all_objs:
-            if obj.shape == shape:
-                return obj
+        return ShapeRegistry.owner(shape)
     
     def __init__(self, x, y, radius=100, color=(210, 200, 200)):
         Obj.all_objs.append(self)
@@ -54,10 +50,11 @@ class Obj:
         self.body.position = x, y
         self.shape = pymunk.Circle(self.body, radius, Vec2d(0, 0))
         self.shape.color = pygame.Color(color)
+        ShapeRegistry.register(self, self.shape, self.body)
         space.add(self.body, self.shape)
 
     def add_mask(self, mask):
-        self.shape.filter = pymunk.ShapeFilter(categories=self.shape.filter.categories, mask=mask)
+        self.shape.filter = pymunk.ShapeFilter(group=self.shape.filter.group, categories=self.shape.filter.categories, mask=mask)
 
     def calc_imp_components_from_point(self, point):
         pos = self.body.position
@@ -65,6 +62,14 @@ class Obj:
         angle = math.atan2(point[1] - pos.y, point[0] - pos.x)
         return impulse * math.cos(angle), impulse * math.sin(angle)
 
+    def draw(self, surface):
+        pos = self.body.position
+        rect = pygame.draw.circle(surface, self.shape.color, pos, self.shape.radius)
+        pygame.draw.circle(surface, Obj.outline_col, pos, self.shape.radius, 1)
+        #the line shows the rotation, like debug_draw
+        pygame.draw.line(surface, Obj.outline_col, pos, pos + Vec2d(self.shape.radius, 0).rotated(self.body.angle))
+        return rect
+
 
 class Timmy(Obj):
     def __init__(self, x, y):
@@ -93,27 +98,6 @@ class Carlos(Obj):
         return "Carlos"
 
 
-class CollFilterMask:
-    def __new__(cls, whitelist, *params):
-        obj = object.__new__(cls)
-        if whitelist:
-            obj.__whitelist_init(params)
-        else:
-            obj.__blacklist_init(params)
-        return obj
-    
-    def __whitelist_init(self, filter_objs):
-        self.mask = 0
-        for obj in filter_objs:
-            self.mask += obj.shape.filter.categories
-
-    def __blacklist_init(self, filter_objs):
-        self.mask = pymunk.ShapeFilter.ALL_MASKS()
-        for obj in filter_objs:
-            self.mask -= obj.shape.filter.categories
-
-
-
 timmy = Timmy(200, 550) #red
 johnny = Johnny(600, 550) #green
 carlos = Carlos(400, 550 - 347) #blue
@@ -124,6 +108,14 @@ johnny.add_mask(test2.mask)
 carlos.add_mask(test1.mask)
 
 
+obj_layer = SleepLayer(screen, sleep, Obj.draw)
+
+def draw_background(surface):
+    #sleeping objects are part of the background
+    surface.fill((30, 30, 40))
+    surface.blit(obj_layer.layer, (0, 0))
+
+dirty = DirtyRenderer(screen, draw_background)
 
 ### Mainloop
 while run:
@@ -134,14 +126,17 @@ while run:
             run = False
 
     ### Clear screen
-    screen.fill((30, 30, 40))
+    if obj_layer.refresh(Obj.all_objs):
+        dirty.invalidate()
+    dirty.restore()
 
     ### Draw stuff
-    space.debug_draw(draw_options)
+    for obj in sleep.awake(Obj.all_objs):
+        dirty.add(obj.draw(screen))
 
     mouse_pos = pygame.mouse.get_pos()
 
-    query_res = space.point_query_nearest(mouse_pos, float("inf"), pymunk.ShapeFilter())
+    query_res = hover.query(mouse_pos)
     if query_res is not None:
         shape = query_res.shape
         if shape is not None:
@@ -153,18 +148,29 @@ while run:
                 impulse = obj.calc_imp_components_from_point(mouse_pos)
                 obj.body.apply_impulse_at_local_point(impulse)
             #pygame.draw.circle(screen, pygame.Color("white"), p, int(r), 2)
-            pygame.draw.line(screen, pygame.Color("white"), p, mouse_pos)
+            dirty.add(pygame.draw.line(screen, pygame.Color("white"), p, mouse_pos))
+
+            #the hovered object doesn't see itself
+            sensor.shape_filter = pymunk.ShapeFilter(mask=pymunk.ShapeFilter.ALL_MASKS() ^ shape.filter.categories)
+            hit, distance, points, normals, shape_ids = sensor.fan(shape.body.position, sensor_rays, sensor_range)
+            for point in points[hit]:
+                dirty.add(pygame.draw.circle(screen, pygame.Color("yellow"), point, 3))
+            hit, distance, points, normals, shape_ids = sensor.cast([shape.body.position], [mouse_pos])
+            if hit[0]:
+                dirty.add(pygame.draw.circle(screen, pygame.Color("red"), points[0], 6, 2))
 
     ### Update physics
     dt = 1.0 / 60.0
     for x in range(1):
         space.step(dt)
+        hover.notify_step()
 
     ### Flip screen
-    pygame.display.update()
+    dirty.present()
     clock.tick(50)
-    pygame.display.set_caption("fps: " + str(clock.get_fps()))
+    pygame.display.set_caption("fps: " + str(clock.get_fps()) + "   " + sleep.stats() + "   " + dirty.stats())
 
+sensor.close()
 pygame.quit()
 
 
@@ -1,11 +1,19 @@
 import random, math
 
+import numpy as np
+
 import pygame
 
 import pymunk
 import pymunk.pygame_util
 from pymunk import Vec2d
 
+from registry import ShapeRegistry
+from collfilter import CollFilter
+from batch_query import BatchQuery
+from sleep import SleepTracker, SleepLayer
+from dirty_rects import DirtyRenderer
+
 
 
 pygame.init()
@@ -17,35 +25,19 @@ run = True
 space = pymunk.Space()
 space.gravity = Vec2d(0.0, 0.0)
 draw_options = pymunk.pygame_util.DrawOptions(screen)
+#no gravity, so the idle speed has to be given: objects nobody pushes fall asleep
+sleep = SleepTracker(space, idle_time=0.5, idle_speed=5)
 
 
 ### Object creation
-class CollFilter:
-    cur_index = "0b1"
-    all_filters = {}
-    
-    def __init__(self, name):
-        self.name = name
-        if name in CollFilter.all_filters.keys():
-            raise Exception(f"{name} is already a filter.")
-        CollFilter.all_filters[name] = self
-        self.filter = pymunk.ShapeFilter(categories=eval(CollFilter.cur_index))
-        CollFilter.cur_index += "0"
-
-    @classmethod
-    def get(cls, name):
-        return cls.all_filters[name]
-
-
 class Obj:
     mass = 10
+    outline_col = pygame.Color(44, 62, 80)
     all_objs = []
 
     @staticmethod
     def find_by_shape(shape):
-        for obj in Obj.all_objs:
-            if obj.shape == shape:
-                return obj
+        return ShapeRegistry.owner(shape)
     
     def __init__(self, x, y, radius=100, color=(210, 200, 200)):
         Obj.all_objs.append(self)
@@ -54,10 +46,11 @@ class Obj:
         self.body.position = x, y
         self.shape = pymunk.Circle(self.body, radius, Vec2d(0, 0))
         self.shape.color = pygame.Color(color)
+        ShapeRegistry.register(self, self.shape, self.body)
         space.add(self.body, self.shape)
 
     def add_mask(self, mask):
-        self.shape.filter = pymunk.ShapeFilter(categories=self.shape.filter.categories, mask=mask)
+        self.shape.filter = pymunk.ShapeFilter(group=self.shape.filter.group, categories=self.shape.filter.categories, mask=mask)
 
     def calc_imp_components_from_point(self, point):
         pos = self.body.position
@@ -65,6 +58,14 @@ class Obj:
         angle = math.atan2(point[1] - pos.y, point[0] - pos.x)
         return impulse * math.cos(angle), impulse * math.sin(angle)
 
+    def draw(self, surface):
+        pos = self.body.position
+        rect = pygame.draw.circle(surface, self.shape.color, pos, self.shape.radius)
+        pygame.draw.circle(surface, Obj.outline_col, pos, self.shape.radius, 1)
+        #the line shows the rotation, like debug_draw
+        pygame.draw.line(surface, Obj.outline_col, pos, pos + Vec2d(self.shape.radius, 0).rotated(self.body.angle))
+        return rect
+
 
 class Timmy(Obj):
     def __init__(self, x, y):
@@ -93,38 +94,29 @@ class Carlos(Obj):
         return "Carlos"
 
 
-class CollFilterMask:
-    def __new__(cls, whitelist, *params):
-        obj = object.__new__(cls)
-        if whitelist:
-            obj.__whitelist_init(params)
-        else:
-            obj.__blacklist_init(params)
-        return obj
-    
-    def __whitelist_init(self, filter_objs):
-        self.mask = 0
-        for obj in filter_objs:
-            self.mask += obj.shape.filter.categories
-
-    def __blacklist_init(self, filter_objs):
-        self.mask = pymunk.ShapeFilter.ALL_MASKS()
-        for obj in filter_objs:
-            self.mask -= obj.shape.filter.categories
-
-
-
 timmy = Timmy(200, 550) #red
 johnny = Johnny(600, 550) #green
 carlos = Carlos(400, 550 - 347) #blue
-test1 = CollFilterMask(True, timmy, johnny)
-test2 = CollFilterMask(True, carlos)
-timmy.add_mask(test2.mask)
-johnny.add_mask(test2.mask)
-carlos.add_mask(test1.mask)
+filter_names = ["timmy", "johnny", "carlos"]
+filter_table = CollFilter.build_table(filter_names, [[False, False, True],
+                                                     [False, False, True],
+                                                     [True, True, False]])
+timmy.shape.filter = filter_table["timmy"]
+johnny.shape.filter = filter_table["johnny"]
+carlos.shape.filter = filter_table["carlos"]
 
 
 aim_size = 50
+batch_query = BatchQuery(space)
+aim_boxes = np.zeros((1, 4))
+obj_layer = SleepLayer(screen, sleep, Obj.draw)
+
+def draw_background(surface):
+    #sleeping objects are part of the background
+    surface.fill((30, 30, 40))
+    surface.blit(obj_layer.layer, (0, 0))
+
+dirty = DirtyRenderer(screen, draw_background)
 
 ### Mainloop
 while run:
@@ -135,23 +127,28 @@ while run:
             run = False
 
     ### Clear screen
-    screen.fill((30, 30, 40))
+    if obj_layer.refresh(Obj.all_objs):
+        dirty.invalidate()
+    dirty.restore()
 
     ### Draw stuff
-    space.debug_draw(draw_options)
+    for obj in sleep.awake(Obj.all_objs):
+        dirty.add(obj.draw(screen))
 
     pg_mouse_pos = pygame.mouse.get_pos()
     pm_mouse_pos = pymunk.pygame_util.get_mouse_pos(screen)
 
     aim_rect = pygame.Rect(pg_mouse_pos[0] - aim_size // 2, pg_mouse_pos[1] - aim_size // 2, aim_size, aim_size)
-    shapes = space.bb_query(pymunk.BB(pm_mouse_pos[0] - aim_size // 2, pm_mouse_pos[1] - aim_size // 2, pm_mouse_pos[0] + aim_size // 2, pm_mouse_pos[1] + aim_size // 2),
-                            pymunk.ShapeFilter())
-    for shape in shapes:
+    #one box per cursor, more cursors/agents are just more rows
+    aim_boxes[0] = pm_mouse_pos[0] - aim_size // 2, pm_mouse_pos[1] - aim_size // 2, pm_mouse_pos[0] + aim_size // 2, pm_mouse_pos[1] + aim_size // 2
+    offsets, shape_ids = batch_query.bb_query(aim_boxes)
+    for shape_id in shape_ids[offsets[0]:offsets[1]]:
+        shape = ShapeRegistry.shape_of(shape_id)
         p = pymunk.pygame_util.to_pygame(shape.body.position, screen)
         r = shape.radius + 4
-        pygame.draw.circle(screen, pygame.Color("white"), p, int(r), 2)
+        dirty.add(pygame.draw.circle(screen, pygame.Color("white"), p, int(r), 2))
 
-    pygame.draw.rect(screen, pygame.Color("white"), aim_rect, 2)
+    dirty.add(pygame.draw.rect(screen, pygame.Color("white"), aim_rect, 2))
 
     ### Update physics
     dt = 1.0 / 60.0
@@ -159,9 +156,9 @@ while run:
         space.step(dt)
 
     ### Flip screen
-    pygame.display.update()
+    dirty.present()
     clock.tick(50)
-    pygame.display.set_caption("fps: " + str(clock.get_fps()))
+    pygame.display.set_caption("fps: " + str(clock.get_fps()) + "   " + sleep.stats() + "   " + dirty.stats())
 
 pygame.quit()
 
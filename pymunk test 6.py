@@ -35,6 +35,11 @@ class TargetPoint:
     point_lock = False
     cur_id = 0
 
+    #the query polygon is built once, its vertices are only updated when a point changes
+    version = 0
+    shape = None
+    shape_version = -1
+
     @classmethod
     def all(cls):
         for p in cls.all_points:
@@ -43,11 +48,20 @@ class TargetPoint:
 
     @classmethod
     def get_shape(cls):
-        return pymunk.Poly(pymunk.Body(body_type=pymunk.Body.KINEMATIC), [point.pm_coords for point in cls.all()])
+        vertices = [point.pm_coords for point in cls.all()]
+        if cls.shape is None:
+            cls.shape = pymunk.Poly(pymunk.Body(body_type=pymunk.Body.KINEMATIC), vertices)
+            cls.shape_version = cls.version
+        elif cls.shape_version != cls.version:
+            cls.shape.unsafe_set_vertices(vertices)
+            cls.shape_version = cls.version
+        cls.shape.cache_bb()
+        return cls.shape
         
 
     def __init__(self, pm_coords : tuple):
         TargetPoint.cur_id += 1
+        TargetPoint.version += 1
         TargetPoint.all_points.append(self)
         if TargetPoint.p0 == None:
             TargetPoint.p0 = self
@@ -69,6 +83,7 @@ class TargetPoint:
 
     def delete(self):
         if TargetPoint.p0 is not self:
+            TargetPoint.version += 1
             TargetPoint.all_points.remove(self)
             for p in TargetPoint.all():
                 if p.next is self:
@@ -97,7 +112,11 @@ class TargetPoint:
 
     def update(self):
         if self.selected:
-            self.pm_coords = pymunk.pygame_util.get_mouse_pos(screen)
+            pm_coords = Vec2d(*pymunk.pygame_util.get_mouse_pos(screen))
+            if pm_coords == self.pm_coords:
+                return
+            TargetPoint.version += 1
+            self.pm_coords = pm_coords
             self.pg_coords = pymunk.pygame_util.to_pygame(self.pm_coords, screen)
             self.txt_rect.topleft = self.pg_coords[0] - 40, self.pg_coords[1] - 40
 
@@ -125,11 +144,18 @@ class QueryDisplay:
     txt_rect.topleft = 20, 20
     query_res = []
     rect_side = 50
+    query_key = None
     
     @classmethod
     def update(cls):
         if len(TargetPoint.all_points) >= 3:
-            cls.query_res = space.shape_query(TargetPoint.get_shape())
+            shape = TargetPoint.get_shape()
+            #the shape query is skipped if neither the polygon nor the bodies around it changed
+            near_bodies = tuple((s, s.body.position, s.body.angle) for s in space.bb_query(shape.bb, pymunk.ShapeFilter()))
+            query_key = (TargetPoint.version, near_bodies)
+            if query_key != cls.query_key:
+                cls.query_key = query_key
+                cls.query_res = space.shape_query(shape)
 
 
     @classmethod
@@ -1,11 +1,16 @@
-import math, random
+import math, random, collections
 
+import numpy as np
 import pygame
 
 import pymunk
 import pymunk.pygame_util
 from pymunk import Vec2d
 
+from telemetry import TelemetrySink
+from sleep import SleepTracker, SleepLayer
+from dirty_rects import DirtyRenderer
+
 
 
 pygame.init()
@@ -19,52 +24,105 @@ test = None
 space = pymunk.Space()
 space.gravity = Vec2d(0.0, 10000.0)
 draw_options = pymunk.pygame_util.DrawOptions(screen)
+sleep = SleepTracker(space, idle_time=0.5)
 
 collhandler = space.add_collision_handler(0, 0)
 collhandler.data["surface"] = screen
+telemetry = TelemetrySink("test7_collisions.tlm")
 
 
 
 ### Object definition
 class Graph:
-    def __init__(self, rect, col, point_distance=1):
-        self.values = []
-        self.points = []
+    '''
+    Scrolling line graph of the last values added. The values are kept in a fixed size ring buffer
+    (as many as fit in the rect) and the max is tracked with a monotonic queue, so adding is O(1).
+    With scroll=True the surface is shifted and only the newest segment is drawn, unless the max changed.
+    '''
+
+    def __init__(self, rect, col, point_distance=1, scroll=False):
         self.col = col
         self.rect = rect
         self.surf = pygame.Surface((rect.w, rect.h), pygame.SRCALPHA, 32)
         self.surf.convert_alpha()
         self.point_distance = point_distance
+        self.scroll = scroll
+
+        self.capacity = rect.w // point_distance + 1
+        self.values = np.zeros(self.capacity)
+        self.head = 0
+        self.count = 0
+        self.added = 0
+        self.max_queue = collections.deque()
+        self.points = np.zeros((0, 2))
+
+        self.drawn_max = None
+        self.drawn_added = 0
 
 
     def add(self, val):
-        self.values = [val] + self.values
+        #values that are smaller than a newer one can never be the max again
+        while self.max_queue and self.max_queue[-1][1] <= val:
+            self.max_queue.pop()
+        self.max_queue.append((self.added, val))
+        if self.max_queue[0][0] <= self.added - self.capacity:
+            self.max_queue.popleft()
+
+        self.values[self.head] = val
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self.added += 1
+
+
+    @property
+    def max_val(self):
+        return self.max_queue[0][1] if self.max_queue else 0
+
+
+    @property
+    def changed(self):
+        return self.added != self.drawn_added or self.max_val != self.drawn_max
+
+
+    def newest_first(self):
+        return self.values[(self.head - 1 - np.arange(self.count)) % self.capacity]
 
 
     def update(self):
-        if self.values:
-            self.points = []
-            max_val = max(self.values)
-            if max_val > 0:
-                for i, val in enumerate(self.values):
-                    py = self.rect.h - (self.rect.h * val / max_val)
-                    px = self.rect.w - (i * self.point_distance)
-                    self.points.append((px, py))
+        max_val = self.max_val
+        if self.count and max_val > 0:
+            values = self.newest_first()
+            self.points = np.empty((self.count, 2))
+            self.points[:, 0] = self.rect.w - np.arange(self.count) * self.point_distance
+            self.points[:, 1] = self.rect.h - (self.rect.h * values / max_val)
+        else:
+            self.points = np.zeros((0, 2))
 
 
     def draw(self):
-        self.surf.fill(pygame.Color(0,0,0,0))
-        #print()
-        for p0, p1 in zip(self.points[:-1], self.points[1:]):
-            #print(p0, p1)
-            pygame.draw.line(self.surf, self.col, p0, p1)
-        screen.blit(self.surf, self.rect)
+        new_values = self.added - self.drawn_added
+        can_scroll = self.scroll and self.drawn_max == self.max_val and 0 < new_values < self.count
+
+        if can_scroll:
+            shift = new_values * self.point_distance
+            self.surf.scroll(-shift, 0)
+            self.surf.fill(pygame.Color(0,0,0,0), (self.rect.w - shift, 0, shift, self.rect.h))
+            points = self.points[:new_values + 1]
+        else:
+            self.surf.fill(pygame.Color(0,0,0,0))
+            points = self.points
+
+        if len(points) >= 2:
+            pygame.draw.lines(self.surf, self.col, False, points.tolist())
+        self.drawn_max = self.max_val
+        self.drawn_added = self.added
+        return screen.blit(self.surf, self.rect)
             
 
 
 
 ### Object creation
-#testgraph = Graph(pygame.Rect(0,0,800,200), pygame.Color((50, 150, 225)), 4)
+speed_graph = Graph(pygame.Rect(0,0,800,200), pygame.Color((50, 150, 225)), 4, scroll=True)
 
 
 floor = pymunk.Segment(space.static_body, Vec2d(0, 800), Vec2d(800, 800), 4.0)
@@ -90,6 +148,23 @@ space.add(b_body, blue)
 b_body.apply_impulse_at_world_point(Vec2d(1000.0, 0.0), b_body.position)
 
 
+def draw_ball(shape, surface):
+    pos = shape.body.position
+    rect = pygame.draw.circle(surface, shape.color, pos, shape.radius)
+    pygame.draw.line(surface, pygame.Color(44, 62, 80), pos, pos + Vec2d(shape.radius, 0).rotated(shape.body.angle))
+    return rect
+
+ball_layer = SleepLayer(screen, sleep, draw_ball)
+
+def draw_background(surface):
+    #the floor and the sleeping balls never move
+    surface.fill((30, 30, 40))
+    pygame.draw.line(surface, pygame.Color(200, 200, 200), floor.a, floor.b, int(floor.radius * 2))
+    surface.blit(ball_layer.layer, (0, 0))
+
+dirty = DirtyRenderer(screen, draw_background)
+
+
 
 ### Setup
 def coll_func(arbiter, space, data):
@@ -97,7 +172,7 @@ def coll_func(arbiter, space, data):
     if arbiter.is_first_contact:
         if (arbiter.shapes[0] is red or arbiter.shapes[0] is blue) and (arbiter.shapes[1] is red or arbiter.shapes[1] is blue):
             test = arbiter.contact_point_set
-            print(arbiter.total_impulse)
+            telemetry.write_arbiter(arbiter)
 
     
 collhandler.post_solve = coll_func
@@ -114,12 +189,23 @@ while run:
 
 
     ### Update objects
+    #a sleeping ball doesn't move, the graph only scrolls while it's awake
+    if not b_body.is_sleeping:
+        speed_graph.add(b_body.velocity.length)
+        speed_graph.update()
 
     ### Clear screen
-    screen.fill((30, 30, 40))
+    if ball_layer.refresh([red, blue]):
+        dirty.invalidate()
+    dirty.restore()
 
     ### Draw stuff
-    space.debug_draw(draw_options)
+    for ball in sleep.awake([red, blue]):
+        dirty.add(draw_ball(ball, screen))
+    #the graph surface is transparent, its old lines have to go first
+    if speed_graph.changed or dirty.touched(speed_graph.rect):
+        dirty.erase(speed_graph.rect)
+        dirty.add(speed_graph.draw())
 
     pg_mouse_pos = pygame.mouse.get_pos()
     pm_mouse_pos = pymunk.pygame_util.get_mouse_pos(screen)
@@ -128,10 +214,12 @@ while run:
     dt = 1.0 / 600.0
     for x in range(1):
         space.step(dt)
+        telemetry.step()
 
     ### Flip screen
-    pygame.display.update()
+    dirty.present()
     clock.tick(50)
-    pygame.display.set_caption("pymunk test 6" + " "*30 + "fps: " + str(clock.get_fps()))
+    pygame.display.set_caption("pymunk test 6" + " "*30 + "fps: " + str(clock.get_fps()) + "   " + sleep.stats() + "   " + dirty.stats())
 
+telemetry.close()
 pygame.quit()
@@ -6,6 +6,13 @@ import pymunk
 import pymunk.pygame_util
 from pymunk import Vec2d
 
+from registry import ShapeRegistry
+from collfilter import CollFilter
+from rope import Rope, add_ropes
+from solver_control import IterationController
+from rope_render import RopeRenderer
+from drag import DragSystem
+
 
 
 pygame.init()
@@ -13,15 +20,16 @@ screen = pygame.display.set_mode((800, 800))
 clock = pygame.time.Clock()
 run = True
 test = None
+show_debug_draw = False
 
 
 ### Physics stuff
 space = pymunk.Space()
 space.gravity = Vec2d(0.0, 9000.0)
 draw_options = pymunk.pygame_util.DrawOptions(screen)
-
-collhandler = space.add_collision_handler(0, 0)
-collhandler.data["surface"] = screen
+#the chain stretches with the default iterations, let the controller pick them
+#the end pins carry the whole chain and never get under a pixel, so the mean error is the target
+solver = IterationController(space, target_error=2.0, min_iterations=5, max_iterations=60, metric="mean")
 
 
 
@@ -31,14 +39,16 @@ class ChainEstremity:
     half_side = 40
     mass = 10
     
-    def __init__(self, center):
+    def __init__(self, center, group=0):
         half_side = ChainEstremity.half_side
         self.body = pymunk.Body(body_type=pymunk.Body.STATIC)
         self.shape = pymunk.Poly(self.body,
                                  [(-half_side,-half_side), (half_side,-half_side), (half_side,half_side), (-half_side, half_side)]
                                  )
         self.shape.mass = ChainEstremity.mass
+        self.shape.filter = pymunk.ShapeFilter(group=group)
         self.body.position = center
+        ShapeRegistry.register(self, self.shape, self.body)
         space.add(self.body, self.shape)
 
 
@@ -50,47 +60,33 @@ class ChainEstremity:
 
     
 class Chain:
-    estremities = []
-    links_offset = 0
-    all_links = []
+    all_chains = []
+    renderer = None
+
+    def __init__(self, point_a, point_b, chain_links, recipe="link"):
+        #links and estremities share a group, so chipmunk discards their contacts in the broadphase
+        self.group = CollFilter.new_group()
+        self.estremities = [ChainEstremity(point_a, self.group), ChainEstremity(point_b, self.group)]
+        #the rope is only built here, add_chains puts all the chains in the space with one add
+        self.rope = Rope([point_a, point_b], chain_links, recipe, ChainLink.radius, ChainLink.mass, self.group,
+                         self.estremities[0].body, self.estremities[1].body)
+        self.links = [ChainLink(shape1, shape2) for shape1, shape2 in self.rope.links]
+        Chain.all_chains.append(self)
 
 
     @classmethod
-    def get_links(cls):
-        for link in cls.all_links:
-            yield link
-            
-    
-    def __init__(self, point_a, point_b, chain_links):
-        Chain.estremities.append(ChainEstremity(point_a))
-        Chain.estremities.append(ChainEstremity(point_b))
-
-        estremities_dist = Chain.estremities[0].body.position.get_distance(Chain.estremities[1].body.position)
-        links_length = estremities_dist // chain_links
-        first_link = ChainLink(links_length)
-        Chain.all_links.append(first_link)
-        first_link.setup(Chain.estremities[0].body.position)
-        first_link_constraint = pymunk.constraints.PinJoint(Chain.estremities[0].body, first_link.shape1.body)
-        first_link_constraint.collide_bodies = False
-        space.add(first_link_constraint)
-        
-        for i in range(1, chain_links):
-            new_link = ChainLink(links_length)
-            Chain.all_links.append(new_link)
-            new_link.setup(Chain.estremities[0].body.position + Vec2d(links_length * i, 0))
-            new_link.link_to(Chain.all_links[i-1])
-            
-            if i == chain_links - 1:
-                last_link_costraint = pymunk.constraints.PinJoint(Chain.estremities[1].body, new_link.shape2.body)
-                last_link_costraint.collide_bodies = False
-                space.add(last_link_costraint)
+    def add_chains(cls):
+        add_ropes(space, [chain.rope for chain in cls.all_chains if chain.rope.bodies[0].space is None])
+        cls.renderer = RopeRenderer(screen, space, [chain.rope for chain in cls.all_chains], ChainLink.fill_col)
 
 
-    def draw(self):
-        for estremity in Chain.estremities:
-            estremity.draw()
-        for link in self.get_links():
-            link.draw()
+    @classmethod
+    def draw_all(cls):
+        for chain in cls.all_chains:
+            for estremity in chain.estremities:
+                estremity.draw()
+        #all the links of all the chains in one blits call
+        cls.renderer.draw()
 
 
 
@@ -99,88 +95,25 @@ class ChainLink:
     mass = 1
     fill_col = pygame.Color(20, 110, 240)
     
-    def __init__(self, length):
-        self.length = length
-        self.shape1 = pymunk.Circle(pymunk.Body(), ChainLink.radius)
-        self.shape2 = pymunk.Circle(pymunk.Body(), ChainLink.radius)
-        self.shape1.mass = ChainLink.mass
-        self.shape2.mass = ChainLink.mass
-        self.rotary_limit = pymunk.constraints.RotaryLimitJoint(self.shape1.body, self.shape2.body, 0, 0)
-        space.add(self.shape1, self.shape1.body, self.shape2, self.shape2.body, self.rotary_limit)
-
-
-    def setup(self, pos1):
-        self.shape1.body.position = pos1
-        self.shape2.body.position = Vec2d(pos1[0] + self.length, pos1[1])
-        self.constraint1 = pymunk.constraints.PinJoint(self.shape1.body,
-                                                      self.shape2.body,
-                                                      Vec2d(0, ChainLink.radius),
-                                                      Vec2d(0, ChainLink.radius))
-        self.constraint2 = pymunk.constraints.PinJoint(self.shape1.body,
-                                                      self.shape2.body,
-                                                      Vec2d(0, -ChainLink.radius),
-                                                      Vec2d(0, -ChainLink.radius))
-        self.constraint3 = pymunk.constraints.PinJoint(self.shape1.body,
-                                                      self.shape2.body,
-                                                      Vec2d(ChainLink.radius, 0),
-                                                      Vec2d(-ChainLink.radius, 0))
-        self.constraint1.collide_bodies = False
-        self.constraint2.collide_bodies = False
-        space.add(self.constraint1, self.constraint2, self.constraint3)
-
-
-    def get_full_length(self):
-        return self.length + ChainLink.radius * 2
-
-
-    def link_to(self, other):
-        #NOTE: in the chain this object links to the previous one added
-        slide_constraint = pymunk.constraints.SlideJoint(self.shape1.body, other.shape2.body,
-                                                 Vec2d(0, 0), Vec2d(-ChainLink.radius, 0),
-                                                 other.get_full_length() // 2, (other.get_full_length() + ChainLink.radius) // 2)
-        rotary_constraint = pymunk.constraints.RotaryLimitJoint(self.shape1.body, other.shape2.body, -math.pi // 2, math.pi // 2)
-        slide_constraint.collide_bodies = False
-        rotary_constraint.collide_bodies = False
-        space.add(slide_constraint, rotary_constraint)
-
-
-    def draw(self):
-        pygame.draw.circle(screen, ChainLink.fill_col, self.shape1.body.position, ChainLink.radius)
-        pygame.draw.circle(screen, ChainLink.fill_col, self.shape2.body.position, ChainLink.radius)
-        pygame.draw.line(screen, ChainLink.fill_col, self.shape1.body.position, self.shape2.body.position, width=ChainLink.radius*2)
+    def __init__(self, shape1, shape2):
+        self.shape1 = shape1
+        self.shape2 = shape2
+        ShapeRegistry.register(self, self.shape1, self.shape2, self.shape1.body, self.shape2.body)
             
 
 
 
 ### Object creation
 mychain = Chain(Vec2d(50, 200), Vec2d(750, 200), 10)
+Chain.add_chains()
+#left button drags a link
+drag = DragSystem(space, radius=10)
+drag.mark_space()
 
 
-#mychain.all_links[4].shape2.body.apply_impulse_at_local_point(Vec2d(0, 100000))
-
-
-
-def pre_coll_func(arbiter, space, data):
-    link_shapes1 = [link.shape1 for link in mychain.all_links]
-    link_shapes2 = [link.shape2 for link in mychain.all_links]
-    estremities_shapes = [estremity.shape for estremity in mychain.estremities]
+#mychain.links[4].shape2.body.apply_impulse_at_local_point(Vec2d(0, 100000))
 
-    shape0_is_chainlink = arbiter.shapes[0] in link_shapes1 or arbiter.shapes[0] in link_shapes2
-    shape1_is_chainlink = arbiter.shapes[1] in link_shapes1 or arbiter.shapes[1] in link_shapes2
-    shape0_is_estremity = arbiter.shapes[0] in estremities_shapes
-    shape1_is_estremity = arbiter.shapes[1] in estremities_shapes
-
-    if shape0_is_chainlink and shape1_is_chainlink:
-        return False
-    
-    if (shape0_is_estremity and shape1_is_chainlink) or (shape1_is_estremity and shape0_is_chainlink):
-        return False
-
-    print(arbiter.shapes)
-    
-    return True
 
-collhandler.pre_solve = pre_coll_func
 
 
 
@@ -191,6 +124,9 @@ while run:
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
             run = False
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_d:
+            show_debug_draw = not show_debug_draw
+        drag.handle_event(event, screen.get_size())
 
 
     ### Update objects
@@ -199,8 +135,10 @@ while run:
     screen.fill((30, 30, 40))
 
     ### Draw stuff
-    mychain.draw()
-    space.debug_draw(draw_options)
+    Chain.draw_all()
+    #debug_draw goes over the same bodies, only on request
+    if show_debug_draw:
+        space.debug_draw(draw_options)
 
     pg_mouse_pos = pygame.mouse.get_pos()
     pm_mouse_pos = pymunk.pygame_util.get_mouse_pos(screen)
@@ -209,10 +147,11 @@ while run:
     dt = 1.0 / 60.0
     for x in range(1):
         space.step(dt)
+        solver.update()
 
     ### Flip screen
     pygame.display.update()
     clock.tick(50)
-    pygame.display.set_caption("pymunk test chain" + " "*30 + "fps: " + str(clock.get_fps()))
+    pygame.display.set_caption("pymunk test chain" + " "*30 + "fps: " + str(clock.get_fps()) + "   " + solver.stats() + "   " + drag.stats())
 
 pygame.quit()
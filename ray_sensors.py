@@ -0,0 +1,117 @@
+"""Batched ray sensors.
+
+Casts many rays at once through segment_query_first and writes the results in
+preallocated NumPy arrays: hit flag, distance, point, normal and shape id (-1
+for no hit). The arrays are reused by the next cast, copy them if they must be
+kept. Shape ids come from the shared ShapeRegistry table,
+ShapeRegistry.shape_of(id) gives the shape back.
+
+Big casts can be split over a thread pool, close() shuts it down. Queries
+on chipmunk's default BB tree are read only, but the spatial hash updates its
+query stamp during a query, so threaded casts need a space that stays on the
+tree: don't use threads on a space a BroadphaseAdvisor may switch to the hash.
+Most of the work per ray is in pymunk's python wrapper anyway, so threads only
+help as much as the GIL allows.
+"""
+
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import pymunk
+
+from registry import ShapeRegistry
+
+
+class RaySensor:
+    def __init__(self, space, shape_filter=pymunk.ShapeFilter(), capacity=64, threads=0, min_parallel_rays=256):
+        '''
+        threads > 0 casts big batches in parallel, the space must use the BB tree (the default).
+        '''
+        self.space = space
+        self.shape_filter = shape_filter
+        self.threads = threads
+        self.min_parallel_rays = min_parallel_rays
+        self.pool = ThreadPoolExecutor(threads) if threads > 0 else None
+
+        self.allocate(capacity)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+
+    def allocate(self, capacity):
+        self.capacity = capacity
+        self.hit = np.zeros(capacity, dtype=bool)
+        self.distance = np.zeros(capacity)
+        self.point = np.zeros((capacity, 2))
+        self.normal = np.zeros((capacity, 2))
+        self.shape_id = np.full(capacity, -1, dtype=np.int32)
+        self.hit_shapes = [None] * capacity
+
+
+    def cast_range(self, starts, ends, radius, first, last):
+        query = self.space.segment_query_first
+        shape_filter = self.shape_filter
+        for i in range(first, last):
+            start = (starts[i][0], starts[i][1])
+            end = (ends[i][0], ends[i][1])
+            info = query(start, end, radius, shape_filter)
+            if info is None:
+                self.hit[i] = False
+                self.distance[i] = math.dist(start, end)
+                self.point[i] = end
+                self.normal[i] = 0, 0
+                self.hit_shapes[i] = None
+            else:
+                self.hit[i] = True
+                self.distance[i] = info.alpha * math.dist(start, end)
+                self.point[i] = info.point
+                self.normal[i] = info.normal
+                self.hit_shapes[i] = info.shape
+
+
+    def cast(self, starts, ends, radius=0):
+        '''
+        starts and ends are (n, 2) arrays, returns the hit, distance, point, normal and shape_id views.
+        '''
+        n = len(starts)
+        if n > self.capacity:
+            self.allocate(max(n, self.capacity * 2))
+
+        if self.pool is not None and n >= self.min_parallel_rays:
+            chunk = math.ceil(n / self.threads)
+            futures = [self.pool.submit(self.cast_range, starts, ends, radius, first, min(first + chunk, n))
+                       for first in range(0, n, chunk)]
+            for future in futures:
+                future.result()
+        else:
+            self.cast_range(starts, ends, radius, 0, n)
+
+        #shape ids are assigned here and not in the workers, so the id table is only touched by one thread
+        for i in range(n):
+            shape = self.hit_shapes[i]
+            self.shape_id[i] = -1 if shape is None else ShapeRegistry.id_of(shape)
+
+        return self.hit[:n], self.distance[:n], self.point[:n], self.normal[:n], self.shape_id[:n]
+
+
+    def fan(self, center, rays, length, start_angle=0.0, spread=math.pi * 2, radius=0):
+        #lidar style fan of rays around center
+        if spread >= math.pi * 2:
+            angles = start_angle + np.arange(rays) * (spread / rays)
+        else:
+            angles = start_angle + np.linspace(0, spread, rays)
+        starts = np.empty((rays, 2))
+        starts[:] = center
+        ends = starts + length * np.column_stack((np.cos(angles), np.sin(angles)))
+        return self.cast(starts, ends, radius)
+
+
+    def line_of_sight(self, starts, ends):
+        #True where nothing blocks the segment between the pair
+        hit = self.cast(starts, ends)[0]
+        return ~hit
@@ -0,0 +1,348 @@
+"""Independent regions stepped in parallel.
+
+A level made of rooms that never interact (the boxes of the constraints demo,
+the rooms of a sandbox level) doesn't need one big space solved on one core.
+RegionWorld gives every region its own pymunk.Space and steps them together
+on a thread pool. Chipmunk's step is a plain C call that pymunk makes through
+cffi, which releases the GIL for it, so the regions really run on separate
+cores. Python callbacks (collision handlers, velocity funcs) take the GIL back
+while they run and must only touch their own region.
+
+The world is split from a space that was built as usual:
+
+    world = RegionWorld.split(space, bbs)      # told where the regions are
+    world = RegionWorld.split(space)           # or let it find the islands
+
+Dynamic bodies go to the region that contains their position, together with
+their shapes and constraints. Static shapes are copied into every region they
+touch and constraints to a static body are rebuilt on the static body of
+their region, so no two regions touch the same chipmunk body while they are
+stepped. Regions that are still jointed to the same body outside of them (a
+kinematic body left in the old space) share a lane: the regions of a lane
+are stepped one after the other on the same thread.
+
+Bodies that leave their region for another one are moved over every
+migrate_every steps, with everything jointed to them. A group jointed to a
+static or kinematic body (a pivot, a mouse joint) stays where it is. The
+queries search the regions the query touches and merge the results, a static
+shape copied into two regions can come back twice.
+"""
+
+import itertools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pymunk
+
+from constraint_copy import rebuild_constraint
+
+
+def copy_static(shape, body):
+    #same geometry and material on another static body, in world coordinates
+    if isinstance(shape, pymunk.Segment):
+        copy = pymunk.Segment(body, shape.body.local_to_world(shape.a), shape.body.local_to_world(shape.b), shape.radius)
+    elif isinstance(shape, pymunk.Circle):
+        copy = pymunk.Circle(body, shape.radius, shape.body.local_to_world(shape.offset))
+    else:
+        copy = pymunk.Poly(body, [shape.body.local_to_world(v) for v in shape.get_vertices()], radius=shape.radius)
+    copy.friction = shape.friction
+    copy.elasticity = shape.elasticity
+    copy.filter = shape.filter
+    copy.collision_type = shape.collision_type
+    copy.sensor = shape.sensor
+    if hasattr(shape, "color"):
+        copy.color = shape.color
+    return copy
+
+
+def jointed_group(body, space_constraints):
+    #the dynamic bodies jointed to body and their constraints, anchored if one joint holds on to a non dynamic body
+    #constraints that are not in the space (a drag joint kept for later) don't count
+    bodies = {body}
+    constraints = set()
+    anchored = False
+    todo = [body]
+    while todo:
+        for constraint in todo.pop().constraints:
+            if constraint in constraints or constraint not in space_constraints:
+                continue
+            constraints.add(constraint)
+            for other in (constraint.a, constraint.b):
+                if other.body_type != pymunk.Body.DYNAMIC:
+                    anchored = True
+                elif other not in bodies:
+                    bodies.add(other)
+                    todo.append(other)
+    return bodies, constraints, anchored
+
+
+def find_regions(space, margin=20):
+    '''
+    Bounding boxes of the islands of the space: dynamic bodies that are jointed together or whose
+    shapes are closer than margin. Boxes are grown by margin and merged while they overlap.
+    Bodies in different regions never collide, a body only sees the shapes of its own region until
+    it migrates, so margin has to cover how far the islands move between two migrations.
+    '''
+    query_filter = pymunk.ShapeFilter()
+    parent = {}
+
+    def root(body):
+        while parent[body] is not body:
+            parent[body] = parent[parent[body]]
+            body = parent[body]
+        return body
+
+    def join(a, b):
+        if a.body_type == pymunk.Body.DYNAMIC and b.body_type == pymunk.Body.DYNAMIC:
+            parent[root(a)] = root(b)
+
+    for body in space.bodies:
+        if body.body_type == pymunk.Body.DYNAMIC:
+            parent[body] = body
+    for constraint in space.constraints:
+        join(constraint.a, constraint.b)
+    for shape in space.shapes:
+        if shape.body in parent:
+            bb = shape.bb
+            for hit in space.bb_query(pymunk.BB(bb.left - margin, bb.bottom - margin, bb.right + margin, bb.top + margin), query_filter):
+                join(shape.body, hit.body)
+
+    islands = {}
+    for shape in space.shapes:
+        if shape.body in parent:
+            key = root(shape.body)
+            islands[key] = islands[key].merge(shape.bb) if key in islands else shape.bb
+
+    merged = []
+    for bb in islands.values():
+        bb = pymunk.BB(bb.left - margin, bb.bottom - margin, bb.right + margin, bb.top + margin)
+        i = 0
+        while i < len(merged):
+            if bb.intersects(merged[i]):
+                bb = bb.merge(merged.pop(i))
+                i = 0
+            else:
+                i += 1
+        merged.append(bb)
+    return merged
+
+
+
+class Region:
+    def __init__(self, bb, source):
+        self.bb = bb
+        self.space = pymunk.Space()
+        self.space.gravity = source.gravity
+        self.space.damping = source.damping
+        self.space.iterations = source.iterations
+        self.space.sleep_time_threshold = source.sleep_time_threshold
+        self.space.idle_speed_threshold = source.idle_speed_threshold
+        #time of the last step, measured in the worker
+        self.step_time = 0.0
+
+
+    def contains(self, point):
+        return self.bb.contains_vect(point)
+
+    def step(self, dt):
+        started = time.perf_counter()
+        self.space.step(dt)
+        self.step_time = time.perf_counter() - started
+
+
+
+def step_lane(lane, dt):
+    for region in lane:
+        region.step(dt)
+
+
+
+class RegionWorld:
+    def __init__(self, regions, source, workers=None, migrate_every=10):
+        '''
+        Use RegionWorld.split to build one. workers None uses a thread per region up to the cpu
+        count, 1 steps the regions one after the other on the calling thread.
+        '''
+        self.regions = regions
+        #what is left in it (kinematic bodies) can still be jointed to bodies of the regions
+        self.source = source
+        #lists of regions stepped one after the other on one thread
+        self.lanes = [[region] for region in regions]
+        self.migrate_every = migrate_every
+        if workers is None:
+            workers = min(len(regions), os.cpu_count() or 1)
+        self.workers = max(1, workers)
+        self.executor = ThreadPoolExecutor(self.workers) if self.workers > 1 else None
+
+        self.steps = 0
+        self.step_time = 0.0
+        self.migrated = 0
+
+
+    @classmethod
+    def split(cls, space, bbs=None, margin=20, workers=None, migrate_every=10):
+        if bbs is None:
+            bbs = find_regions(space, margin)
+        regions = [Region(bb, space) for bb in bbs]
+        world = cls(regions, space, workers, migrate_every)
+
+        for shape in space.shapes:
+            if shape.body.body_type == pymunk.Body.STATIC:
+                for region in regions:
+                    if region.bb.intersects(shape.bb):
+                        region.space.add(copy_static(shape, region.space.static_body))
+
+        moved = set()
+        space_constraints = set(space.constraints)
+        for body in space.bodies:
+            if body in moved or body.body_type != pymunk.Body.DYNAMIC:
+                continue
+            bodies, constraints, anchored = jointed_group(body, space_constraints)
+            moved |= bodies
+            region = world.region_at(body.position) or world.nearest_region(body.position)
+            shapes = [shape for body in bodies for shape in body.shapes]
+            space.remove(*bodies, *shapes, *constraints)
+            region.space.add(*bodies, *shapes, *[world.localize(constraint, region) for constraint in constraints])
+        world.build_lanes()
+        return world
+
+
+    def localize(self, constraint, region):
+        #a constraint to a static body outside of the region is rebuilt on the region's own static body
+        a, b = constraint.a, constraint.b
+        static = region.space.static_body
+        if a.body_type == pymunk.Body.STATIC and a.space != region.space:
+            a = static
+        if b.body_type == pymunk.Body.STATIC and b.space != region.space:
+            b = static
+        if a is constraint.a and b is constraint.b:
+            return constraint
+        return rebuild_constraint(constraint, a, b)
+
+    def build_lanes(self):
+        #regions jointed to the same body outside of them can't be stepped at the same time
+        lane_of = {region: [region] for region in self.regions}
+        owners = {}
+        for region in self.regions:
+            for constraint in region.space.constraints:
+                for body in (constraint.a, constraint.b):
+                    if body.space == region.space:
+                        continue
+                    other = owners.setdefault(body, region)
+                    if lane_of[other] is not lane_of[region]:
+                        merged = lane_of[other] + lane_of[region]
+                        for member in merged:
+                            lane_of[member] = merged
+        self.lanes = list({id(lane): lane for lane in lane_of.values()}.values())
+
+
+    ### Regions
+    def region_at(self, point):
+        for region in self.regions:
+            if region.contains(point):
+                return region
+        return None
+
+    def nearest_region(self, point):
+        return min(self.regions, key=lambda region: region.bb.center().get_distance(point))
+
+    def region_of(self, body):
+        for region in self.regions:
+            if body.space == region.space:
+                return region
+        return None
+
+    def move(self, bodies, constraints, old_space, new_space):
+        shapes = [shape for body in bodies for shape in body.shapes]
+        old_space.remove(*bodies, *shapes, *constraints)
+        new_space.add(*bodies, *shapes, *constraints)
+
+
+    def migrate(self):
+        #moves the groups that left their region into the region they are in now
+        for region in self.regions:
+            checked = set()
+            space_constraints = None
+            for body in region.space.bodies:
+                if body in checked or body.body_type != pymunk.Body.DYNAMIC or body.is_sleeping or region.contains(body.position):
+                    continue
+                if space_constraints is None:
+                    space_constraints = set(region.space.constraints)
+                bodies, constraints, anchored = jointed_group(body, space_constraints)
+                checked |= bodies
+                if anchored:
+                    continue
+                target = self.region_at(body.position)
+                if target is not None and all(target.contains(other.position) for other in bodies):
+                    self.move(bodies, constraints, region.space, target.space)
+                    self.migrated += len(bodies)
+
+
+    ### Step
+    def step(self, dt):
+        started = time.perf_counter()
+        if self.executor is None:
+            for region in self.regions:
+                region.step(dt)
+        else:
+            list(self.executor.map(step_lane, self.lanes, itertools.repeat(dt)))
+        self.step_time = time.perf_counter() - started
+
+        self.steps += 1
+        if self.migrate_every and self.steps % self.migrate_every == 0:
+            self.migrate()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+
+    ### Queries
+    def regions_touching(self, bb):
+        return [region for region in self.regions if region.bb.intersects(bb)]
+
+    def point_query(self, point, max_distance, shape_filter):
+        bb = pymunk.BB.newForCircle(point, max(max_distance, 0))
+        return [hit for region in self.regions_touching(bb) for hit in region.space.point_query(point, max_distance, shape_filter)]
+
+    def point_query_nearest(self, point, max_distance, shape_filter):
+        bb = pymunk.BB.newForCircle(point, max(max_distance, 0))
+        hits = [region.space.point_query_nearest(point, max_distance, shape_filter) for region in self.regions_touching(bb)]
+        hits = [hit for hit in hits if hit is not None]
+        return min(hits, key=lambda hit: hit.distance) if hits else None
+
+    def bb_query(self, bb, shape_filter):
+        return [shape for region in self.regions_touching(bb) for shape in region.space.bb_query(bb, shape_filter)]
+
+    def segment_query_first(self, start, end, radius, shape_filter):
+        bb = pymunk.BB(min(start[0], end[0]) - radius, min(start[1], end[1]) - radius,
+                       max(start[0], end[0]) + radius, max(start[1], end[1]) + radius)
+        hits = [region.space.segment_query_first(start, end, radius, shape_filter) for region in self.regions_touching(bb)]
+        hits = [hit for hit in hits if hit is not None]
+        return min(hits, key=lambda hit: hit.alpha) if hits else None
+
+
+    ### Drawing
+    @property
+    def bodies(self):
+        return [body for region in self.regions for body in region.space.bodies]
+
+    @property
+    def shapes(self):
+        return [shape for region in self.regions for shape in region.space.shapes]
+
+    @property
+    def constraints(self):
+        return [constraint for region in self.regions for constraint in region.space.constraints]
+
+    def debug_draw(self, options):
+        for region in self.regions:
+            region.space.debug_draw(options)
+
+
+    def stats(self):
+        serial = sum(region.step_time for region in self.regions)
+        return (f"regions: {len(self.regions)}  lanes: {len(self.lanes)}  workers: {self.workers}  step: {self.step_time * 1000:.2f} ms"
+                f"  (regions sum {serial * 1000:.2f} ms)  migrated: {self.migrated}")
@@ -0,0 +1,62 @@
+"""Shape and body to entity registry.
+
+Maps pymunk shapes and bodies back to the object that owns them in O(1). The
+owners are held through weak references, so an entry disappears by itself
+when its entity is garbage collected.
+
+It also hands out shape ids, the small integers the batched queries, ray
+sensors and telemetry write in their arrays. An id belongs to one shape for
+the life of the program and is never given to another one, the table only
+holds the shapes weakly so a destroyed shape leaves it.
+"""
+
+import weakref
+
+import pymunk
+
+
+class ShapeRegistry:
+    shape_owners = weakref.WeakValueDictionary()
+    body_owners = weakref.WeakValueDictionary()
+    shape_ids = weakref.WeakKeyDictionary()
+    id_shapes = weakref.WeakValueDictionary()
+    next_id = 0
+
+    @classmethod
+    def register(cls, entity, *objects):
+        for obj in objects:
+            if isinstance(obj, pymunk.Shape):
+                cls.shape_owners[obj] = entity
+            else:
+                cls.body_owners[obj] = entity
+
+    @classmethod
+    def unregister(cls, *objects):
+        for obj in objects:
+            cls.shape_owners.pop(obj, None)
+            cls.body_owners.pop(obj, None)
+
+    @classmethod
+    def owner(cls, shape):
+        return cls.shape_owners.get(shape)
+
+    @classmethod
+    def owner_of_body(cls, body):
+        return cls.body_owners.get(body)
+
+
+    ### Shape ids
+    @classmethod
+    def id_of(cls, shape):
+        shape_id = cls.shape_ids.get(shape)
+        if shape_id is None:
+            shape_id = cls.next_id
+            cls.next_id += 1
+            cls.shape_ids[shape] = shape_id
+            cls.id_shapes[shape_id] = shape
+        return shape_id
+
+    @classmethod
+    def shape_of(cls, shape_id):
+        #None once the shape is gone
+        return cls.id_shapes.get(int(shape_id))
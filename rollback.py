@@ -0,0 +1,205 @@
+"""Rollback netcode.
+
+Every frame the session saves a cheap snapshot of the dynamic bodies and of
+the players' own state, then steps the world with the inputs of all players.
+Remote inputs that haven't arrived yet are predicted by repeating the last
+known one. When a remote input arrives and differs from the prediction, the
+session restores the snapshot of that frame and resimulates up to the present
+frame, reporting how much time the resimulation took. The resimulation has to
+fit in budget_ms: from the measured cost of a frame the session knows how many
+frames it can afford, and a longer rollback replays what fits and keeps the
+rest for the next frames. sim_frame is the frame the world will simulate next,
+while it's behind frame the world shows a slightly older frame, every advance
+replays the affordable frames plus one so it catches up. No frame is skipped,
+so a clipped rollback ends in the same state as one replayed at once.
+
+Players need get_state() and set_state(state) for their non-body state, the
+step function receives the list of inputs (one per player) of the frame.
+
+Snapshots don't include the contact cache of chipmunk, so a resimulation is
+very close to, but not bit exact with, the original one.
+"""
+
+import collections
+import time
+
+import pymunk
+
+
+class LoopbackTransport:
+    '''
+    Local stand-in for the network: inputs are delivered after a fixed delay in frames.
+    '''
+
+    def __init__(self, delay=6):
+        self.delay = delay
+        self.queue = collections.deque()
+
+    def send(self, player_id, frame, player_input):
+        self.queue.append((frame + self.delay, player_id, frame, player_input))
+
+    def receive(self, now):
+        received = []
+        while self.queue and self.queue[0][0] <= now:
+            deliver_frame, player_id, frame, player_input = self.queue.popleft()
+            received.append((player_id, frame, player_input))
+        return received
+
+
+
+class RollbackSession:
+    neutral_input = (0, False)
+
+    def __init__(self, space, players, step_func, history=16, budget_ms=8.0):
+        self.space = space
+        self.players = players
+        self.step_func = step_func
+        self.history = history
+        self.budget_ms = budget_ms
+
+        self.frame = 0
+        #next frame the world simulates, behind frame while a rollback is being replayed
+        self.sim_frame = 0
+        self.snapshots = [None] * history
+        self.inputs = {}
+        self.confirmed = set()
+        self.last_confirmed = [self.neutral_input] * len(players)
+        self.rollback_to = None
+
+        self.last_resim_frames = 0
+        self.last_resim_ms = 0.0
+        self.max_resim_ms = 0.0
+        self.total_rollbacks = 0
+        self.missed_rollbacks = 0
+        self.over_budget = 0
+        #rollbacks spread over more than one frame to fit the budget
+        self.clipped_rollbacks = 0
+        #running average of the cost of one simulated frame
+        self.frame_ms = 0.0
+
+
+    ### Snapshots
+    def snapshot(self, frame):
+        bodies = [(body, body.position, body.angle, body.velocity, body.angular_velocity)
+                  for body in self.space.bodies if body.body_type == pymunk.Body.DYNAMIC]
+        return frame, bodies, [player.get_state() for player in self.players]
+
+    def restore(self, snapshot):
+        frame, bodies, player_states = snapshot
+        for body, position, angle, velocity, angular_velocity in bodies:
+            body.position = position
+            body.angle = angle
+            body.velocity = velocity
+            body.angular_velocity = angular_velocity
+            body.force = 0, 0
+            body.torque = 0
+        for player, state in zip(self.players, player_states):
+            player.set_state(state)
+
+    def reset_history(self):
+        #bodies were added or removed outside the session, older snapshots are no longer valid
+        self.snapshots = [None] * self.history
+        self.rollback_to = None
+
+
+    ### Inputs
+    def predict(self, player_id):
+        direction, jump = self.last_confirmed[player_id]
+        return direction, False
+
+    def frame_inputs(self, frame):
+        if frame not in self.inputs:
+            self.inputs[frame] = [self.predict(player_id) for player_id in range(len(self.players))]
+        return self.inputs[frame]
+
+    def add_local_input(self, player_id, player_input):
+        self.frame_inputs(self.frame)[player_id] = player_input
+        self.confirmed.add((self.frame, player_id))
+        self.last_confirmed[player_id] = player_input
+
+    def add_remote_input(self, player_id, frame, player_input):
+        if frame < self.frame - self.history:
+            self.missed_rollbacks += 1
+            return
+
+        inputs = self.frame_inputs(frame)
+        #frames from sim_frame on aren't simulated yet and will use the new input anyway
+        if frame < self.sim_frame and inputs[player_id] != player_input:
+            if self.rollback_to is None or frame < self.rollback_to:
+                self.rollback_to = frame
+        inputs[player_id] = player_input
+        self.confirmed.add((frame, player_id))
+        self.last_confirmed[player_id] = player_input
+
+
+    ### Simulation
+    def simulate_frame(self, frame):
+        inputs = self.frame_inputs(frame)
+        for player_id in range(len(self.players)):
+            if (frame, player_id) not in self.confirmed:
+                inputs[player_id] = self.predict(player_id)
+        self.snapshots[frame % self.history] = self.snapshot(frame)
+        self.step_func(inputs)
+
+    def rollback(self):
+        frame = self.rollback_to
+        self.rollback_to = None
+        snapshot = self.snapshots[frame % self.history]
+        if snapshot is None or snapshot[0] != frame:
+            self.missed_rollbacks += 1
+            return
+        self.restore(snapshot)
+        self.sim_frame = frame
+        self.total_rollbacks += 1
+        if self.frame_ms > 0 and self.frame - frame > self.affordable():
+            self.clipped_rollbacks += 1
+
+    def affordable(self):
+        #frames of resimulation that fit in the budget, everything until the first frame is measured
+        if self.frame_ms > 0:
+            return max(1, int(self.budget_ms / self.frame_ms))
+        return self.history
+
+    def resimulate(self):
+        #replays the frames behind the present that fit in the budget, the rest waits for the next advance
+        frames = min(self.frame - self.sim_frame, self.affordable())
+        start = time.perf_counter()
+        for i in range(frames):
+            self.simulate_frame(self.sim_frame)
+            self.sim_frame += 1
+
+        self.last_resim_frames = frames
+        self.last_resim_ms = (time.perf_counter() - start) * 1000
+        self.max_resim_ms = max(self.max_resim_ms, self.last_resim_ms)
+        if self.last_resim_ms > self.budget_ms:
+            self.over_budget += 1
+
+    @property
+    def behind(self):
+        return self.frame - self.sim_frame
+
+    def advance(self):
+        #call once per frame after the local and received inputs were added
+        self.last_resim_frames = 0
+        self.last_resim_ms = 0.0
+        if self.rollback_to is not None:
+            self.rollback()
+        if self.sim_frame < self.frame:
+            self.resimulate()
+
+        #the present frame when caught up, otherwise one more frame of the replay
+        start = time.perf_counter()
+        self.simulate_frame(self.sim_frame)
+        frame_ms = (time.perf_counter() - start) * 1000
+        self.frame_ms = frame_ms if self.frame_ms == 0 else self.frame_ms * 0.9 + frame_ms * 0.1
+        self.sim_frame += 1
+        self.frame += 1
+
+        old_frame = self.frame - self.history - 1
+        self.inputs.pop(old_frame, None)
+        for player_id in range(len(self.players)):
+            self.confirmed.discard((old_frame, player_id))
+
+
+    def stats(self):
+        return f"rollbacks: {self.total_rollbacks}  resim: {self.last_resim_frames} frames {self.last_resim_ms:.2f} ms (max {self.max_resim_ms:.2f})  clipped: {self.clipped_rollbacks}  behind: {self.behind}"
@@ -0,0 +1,153 @@
+"""Rope and chain builder.
+
+A rope is laid along a path (a list of points) and cut into links of equal
+length. The recipe picks how the links are jointed:
+
+    "link"    the chain link of the chain test: two circles per link held
+              rigid by three PinJoints and a RotaryLimitJoint, consecutive
+              links joined by a SlideJoint and a RotaryLimitJoint
+    "pin"     one circle per node, a PinJoint between consecutive nodes
+    "spring"  one circle per node, a DampedSpring between consecutive nodes
+
+Building a rope does not touch the space. Bodies, shapes and constraints are
+collected in lists and added with a single space.add, for one rope with
+add_to(space) or for many ropes at once with add_ropes(space, ropes). All the
+shapes of a rope share a filter group so a rope never collides with itself.
+"""
+
+import math
+
+import pymunk
+from pymunk import Vec2d
+
+
+def path_points(path, count):
+    #count + 1 points evenly spaced along the polyline, ends included
+    path = [Vec2d(*point) for point in path]
+    lengths = [a.get_distance(b) for a, b in zip(path, path[1:])]
+    total = sum(lengths)
+    step = total / count
+
+    points = []
+    segment = 0
+    walked = 0.0
+    for i in range(count + 1):
+        distance = min(step * i, total)
+        while segment < len(lengths) - 1 and walked + lengths[segment] < distance:
+            walked += lengths[segment]
+            segment += 1
+        a, b = path[segment], path[segment + 1]
+        t = (distance - walked) / lengths[segment] if lengths[segment] else 0.0
+        points.append(a + (b - a) * t)
+    return points, step
+
+
+
+class Rope:
+    recipes = ("link", "pin", "spring")
+    spring_stiffness = 20000
+    spring_damping = 200
+
+    def __init__(self, path, links, recipe="link", radius=30, mass=1, group=0, start=None, end=None):
+        '''
+        path is a list of at least two points, start and end are optional bodies (usually static)
+        the first and last node are pinned to.
+        '''
+        if recipe not in Rope.recipes:
+            raise Exception(f"{recipe} is not a rope recipe, use one of {Rope.recipes}.")
+        if len(path) < 2 or links < 1:
+            raise Exception("A rope needs a path of at least two points and one link.")
+
+        self.recipe = recipe
+        self.radius = radius
+        self.mass = mass
+        self.filter = pymunk.ShapeFilter(group=group)
+        self.bodies = []
+        self.shapes = []
+        self.constraints = []
+        #pairs of shapes, one per visible link
+        self.links = []
+
+        points, self.link_length = path_points(path, links)
+        if recipe == "link":
+            self.build_links(points)
+        else:
+            self.build_nodes(points)
+
+        first_body, last_body = self.shapes[0].body, self.shapes[-1].body
+        if start is not None:
+            self.add_constraint(pymunk.constraints.PinJoint(start, first_body))
+        if end is not None:
+            self.add_constraint(pymunk.constraints.PinJoint(end, last_body))
+
+
+    def new_node(self, position):
+        body = pymunk.Body()
+        body.position = position
+        shape = pymunk.Circle(body, self.radius)
+        shape.mass = self.mass
+        shape.filter = self.filter
+        self.bodies.append(body)
+        self.shapes.append(shape)
+        return shape
+
+    def add_constraint(self, constraint):
+        constraint.collide_bodies = False
+        self.constraints.append(constraint)
+
+
+    ### Recipes
+    def build_links(self, points):
+        r = self.radius
+        full_length = self.link_length + r * 2
+        previous = None
+        for a, b in zip(points, points[1:]):
+            direction = (b - a).normalized()
+            side = direction.perpendicular() * r
+            shape1 = self.new_node(a)
+            shape2 = self.new_node(b)
+            body1, body2 = shape1.body, shape2.body
+            #rigid link: no relative rotation and pinned at three points
+            self.add_constraint(pymunk.constraints.RotaryLimitJoint(body1, body2, 0, 0))
+            self.add_constraint(pymunk.constraints.PinJoint(body1, body2, side, side))
+            self.add_constraint(pymunk.constraints.PinJoint(body1, body2, -side, -side))
+            self.add_constraint(pymunk.constraints.PinJoint(body1, body2, direction * r, -direction * r))
+
+            if previous is not None:
+                previous_body, previous_direction = previous
+                self.add_constraint(pymunk.constraints.SlideJoint(body1, previous_body, (0, 0), -previous_direction * r,
+                                                                  full_length // 2, (full_length + r) // 2))
+                self.add_constraint(pymunk.constraints.RotaryLimitJoint(body1, previous_body, -math.pi // 2, math.pi // 2))
+            previous = body2, direction
+            self.links.append((shape1, shape2))
+
+    def build_nodes(self, points):
+        previous = None
+        for point in points:
+            shape = self.new_node(point)
+            if previous is not None:
+                if self.recipe == "pin":
+                    joint = pymunk.constraints.PinJoint(previous.body, shape.body)
+                else:
+                    joint = pymunk.constraints.DampedSpring(previous.body, shape.body, (0, 0), (0, 0), self.link_length,
+                                                            Rope.spring_stiffness, Rope.spring_damping)
+                self.add_constraint(joint)
+                self.links.append((previous, shape))
+            previous = shape
+
+
+    ### Space
+    def physics_objects(self):
+        return self.bodies + self.shapes + self.constraints
+
+    def add_to(self, space):
+        space.add(*self.physics_objects())
+
+
+
+def add_ropes(space, ropes):
+    #one space.add for every body, shape and constraint of all the ropes
+    objects = []
+    for rope in ropes:
+        objects += rope.physics_objects()
+    space.add(*objects)
@@ -0,0 +1,127 @@
+"""Batched rope rendering.
+
+Every link of a rope is drawn as the same capsule (two circles joined by a
+thick line), only rotated. The renderer draws the capsule once, keeps a
+rotated copy of it for each of a fixed number of angles, and each frame:
+
+    - reads the positions of every body of the space with one pymunk.batch
+      call and picks the link bodies out of it by id, vectorized
+    - computes midpoints and angles of all the links vectorized
+    - blits all the links with a single Surface.blits call
+
+A rope is one island, so its first body tells if it sleeps. The links of
+sleeping ropes keep the sprites and positions of the last frame, when every
+rope sleeps the previous blit list is drawn again as it is.
+
+Link lengths are taken from the rope (rigid links and pin ropes keep it),
+a stretched spring rope is drawn with its rest length.
+"""
+
+import math
+
+import numpy as np
+import pygame
+
+import pymunk
+import pymunk.batch
+
+
+class RopeRenderer:
+    fields = pymunk.batch.BodyFields.BODY_ID | pymunk.batch.BodyFields.POSITION
+
+    def __init__(self, surface, space, ropes, color, angle_steps=72):
+        self.surface = surface
+        self.space = space
+        self.buffer = pymunk.batch.Buffer()
+        self.color = color
+        self.angle_steps = angle_steps
+        self.ropes = []
+        self.bodies = []
+        self.set_ropes(ropes)
+
+
+    def set_ropes(self, ropes):
+        #ropes with the same link size share one set of sprites
+        self.ropes = list(ropes)
+        self.bodies = []
+        #all the rotated sprites in one list, sprite set s at angle step a is s * angle_steps + a
+        self.sprites = []
+        half_sizes = []
+        sprite_sets = {}
+        link_sets = []
+        link_ropes = []
+        for i, rope in enumerate(self.ropes):
+            key = (round(rope.link_length), rope.radius)
+            if key not in sprite_sets:
+                sprite_sets[key] = len(sprite_sets)
+                sprites, sizes = self.build_sprites(*key)
+                self.sprites += sprites
+                half_sizes.append(sizes)
+            for shape1, shape2 in rope.links:
+                self.bodies += (shape1.body, shape2.body)
+                link_sets.append(sprite_sets[key])
+                link_ropes.append(i)
+        self.half_sizes = np.concatenate(half_sizes) if half_sizes else np.zeros((0, 2))
+        self.link_sets = np.array(link_sets, dtype=np.int32)
+        self.link_ropes = np.array(link_ropes, dtype=np.int32)
+        #start and end body of every link
+        self.body_ids = np.array([body.id for body in self.bodies], dtype=np.uintp).reshape(-1, 2)
+
+        self.sprite_index = np.zeros(len(link_sets), dtype=np.int32)
+        self.topleft = np.zeros((len(link_sets), 2))
+        self.blit_list = None
+
+
+    def build_sprites(self, length, radius):
+        capsule = pygame.Surface((length + radius * 2, radius * 2), pygame.SRCALPHA)
+        pygame.draw.circle(capsule, self.color, (radius, radius), radius)
+        pygame.draw.circle(capsule, self.color, (length + radius, radius), radius)
+        pygame.draw.rect(capsule, self.color, (radius, 0, length, radius * 2))
+
+        sprites = []
+        half_sizes = np.zeros((self.angle_steps, 2))
+        for i in range(self.angle_steps):
+            #pygame rotates counterclockwise on screen, the y axis points down
+            sprite = pygame.transform.rotate(capsule, -360 * i / self.angle_steps)
+            sprites.append(sprite)
+            half_sizes[i] = sprite.get_width() / 2, sprite.get_height() / 2
+        return sprites, half_sizes
+
+
+    def gather(self, links):
+        #the space hands out its bodies in no fixed order, the link bodies are found by id
+        self.buffer.clear()
+        pymunk.batch.get_space_bodies(self.space, RopeRenderer.fields, self.buffer)
+        ids = np.frombuffer(self.buffer.int_buf(), dtype=np.uintp)
+        positions = np.frombuffer(self.buffer.float_buf()).reshape(-1, 2)
+        order = np.argsort(ids)
+        body_ids = self.body_ids[links]
+        starts = positions[order[np.searchsorted(ids, body_ids[:, 0], sorter=order)]]
+        ends = positions[order[np.searchsorted(ids, body_ids[:, 1], sorter=order)]]
+        return starts, ends
+
+
+    def update_links(self, links):
+        #links is a mask of the links to recompute
+        starts, ends = self.gather(links)
+        middles = (starts + ends) / 2
+        deltas = ends - starts
+        angles = np.arctan2(deltas[:, 1], deltas[:, 0])
+        steps = np.rint(angles * (self.angle_steps / (math.pi * 2))).astype(np.int32) % self.angle_steps
+        index = self.link_sets[links] * self.angle_steps + steps
+        self.sprite_index[links] = index
+        self.topleft[links] = middles - self.half_sizes[index]
+
+        sprites = self.sprites
+        self.blit_list = list(zip([sprites[i] for i in self.sprite_index], self.topleft.tolist()))
+
+
+    def draw(self):
+        if not self.bodies:
+            return
+        awake = np.array([not rope.bodies[0].is_sleeping for rope in self.ropes])
+        if self.blit_list is None:
+            awake[:] = True
+        if awake.any():
+            self.update_links(awake[self.link_ropes])
+        self.surface.blits(self.blit_list, doreturn=False)
@@ -0,0 +1,83 @@
+"""Geometry compilation for static level segments.
+
+Consecutive segments that lie on the same line, touch (or overlap) and share
+the same material are merged into a single segment, so a floor built from
+many tiles ends up as one shape in the space. The merge works on the level
+data, before any shape is made. measure_broadphase times a batch of bb
+queries, to report what a merge saves.
+"""
+
+import random
+import time
+
+import pymunk
+from pymunk import Vec2d
+
+
+def line_key(a, b, precision=3):
+    #direction is normalized to always point "right" so a->b and b->a lie on the same line
+    direction = (Vec2d(*b) - Vec2d(*a)).normalized()
+    if direction.x < 0 or (direction.x == 0 and direction.y < 0):
+        direction = -direction
+    offset = direction.cross(Vec2d(*a))
+    return round(direction.x, 6), round(direction.y, 6), round(offset, precision)
+
+
+def merge_collinear(segments, tolerance=0.001):
+    """Merge collinear touching segments.
+
+    segments is a list of (a, b, key) tuples, only segments with the same key
+    are merged. Returns a new list of (a, b, key) tuples.
+    """
+    lines = {}
+    for a, b, key in segments:
+        a, b = Vec2d(*a), Vec2d(*b)
+        if a == b:
+            lines.setdefault((key, a), []).append((0.0, 0.0, a, Vec2d(1, 0)))
+            continue
+        dx, dy, offset = line_key(a, b)
+        direction = Vec2d(dx, dy)
+        t_a, t_b = direction.dot(a), direction.dot(b)
+        lines.setdefault((key, dx, dy, offset), []).append((min(t_a, t_b), max(t_a, t_b), a - direction * t_a, direction))
+
+    merged = []
+    for line, intervals in lines.items():
+        key = line[0]
+        intervals.sort(key=lambda interval: interval[0])
+        start, end, origin, direction = intervals[0]
+        for interval in intervals[1:]:
+            if interval[0] <= end + tolerance:
+                end = max(end, interval[1])
+            else:
+                merged.append((origin + direction * start, origin + direction * end, key))
+                start, end = interval[0], interval[1]
+        merged.append((origin + direction * start, origin + direction * end, key))
+    return merged
+
+
+def measure_broadphase(space, queries=2000, box_size=50, seed=0, repeat=3):
+    #times a batch of bb queries spread over the space bounds, best of repeat runs in ms
+    shapes = space.shapes
+    if not shapes:
+        return 0.0
+    bb = shapes[0].bb
+    for shape in shapes[1:]:
+        bb = bb.merge(shape.bb)
+
+    rng = random.Random(seed)
+    boxes = []
+    for i in range(queries):
+        x = rng.uniform(bb.left, bb.right)
+        y = rng.uniform(bb.bottom, bb.top)
+        boxes.append(pymunk.BB(x, y, x + box_size, y + box_size))
+
+    query_filter = pymunk.ShapeFilter()
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        for box in boxes:
+            space.bb_query(box, query_filter)
+        elapsed = (time.perf_counter() - start) * 1000
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
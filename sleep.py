@@ -0,0 +1,85 @@
+"""Body sleeping.
+
+SleepTracker turns on chipmunk's sleeping for a space. Chipmunk groups the
+bodies that touch or are jointed together in islands and puts an island to
+sleep once all of its bodies stayed under the idle speed for idle_time
+seconds. A sleeping island costs nothing in space.step, and wakes up when an
+awake body touches it, through a joint to an awake body, or when one of its
+bodies is changed from python (impulse, velocity, position, body.activate()).
+
+Nothing walks the bodies of the space after a step: the sleeping state is
+chipmunk's own, read with body.is_sleeping for the items a scene draws or
+updates anyway. awake(items) keeps the awake ones and remembers the counts
+for stats(). SleepLayer draws sleeping objects once on a cached surface and
+only redraws the awake ones every frame, the cache is rebuilt when one of
+its items fell asleep or woke up.
+"""
+
+import pygame
+
+
+class SleepTracker:
+    def __init__(self, space, idle_time=0.5, idle_speed=0.0):
+        '''
+        idle_speed 0 lets chipmunk derive it from the gravity and the step.
+        '''
+        self.space = space
+        space.sleep_time_threshold = idle_time
+        space.idle_speed_threshold = idle_speed
+        #counts of the last awake call
+        self.sleeping_count = 0
+        self.awake_count = 0
+
+
+    @property
+    def all_asleep(self):
+        return self.awake_count == 0 and self.sleeping_count > 0
+
+
+    def awake(self, items):
+        #items are objects with a body
+        awake = [item for item in items if not item.body.is_sleeping]
+        self.awake_count = len(awake)
+        self.sleeping_count = len(items) - len(awake)
+        return awake
+
+
+    def stats(self):
+        return f"awake: {self.awake_count}  sleeping: {self.sleeping_count}"
+
+
+
+class SleepLayer:
+    '''
+    Draws the sleeping items once on a cached transparent surface and blits it, awake items are
+    drawn directly every frame. draw_item(item, surface) draws one item, so an unbound
+    draw method like Obj.draw works.
+    '''
+    def __init__(self, surface, tracker, draw_item):
+        self.surface = surface
+        self.tracker = tracker
+        self.draw_item = draw_item
+        self.layer = pygame.Surface(surface.get_size(), pygame.SRCALPHA)
+        #the items drawn on the layer
+        self.sleeping = None
+
+
+    def refresh(self, items):
+        #redraws the layer if one of the items fell asleep or woke up, returns True when it did
+        sleeping = [item for item in items if item.body.is_sleeping]
+        if sleeping == self.sleeping:
+            return False
+        self.layer.fill((0, 0, 0, 0))
+        for item in sleeping:
+            self.draw_item(item, self.layer)
+        self.sleeping = sleeping
+        return True
+
+
+    def draw(self, items):
+        self.refresh(items)
+        if self.sleeping:
+            self.surface.blit(self.layer, (0, 0))
+        for item in items:
+            if not item.body.is_sleeping:
+                self.draw_item(item, self.surface)
@@ -0,0 +1,181 @@
+"""Adaptive solver iterations.
+
+Measures how far the space is from satisfying its constraints after every
+step and moves space.iterations between a minimum and a maximum to keep that
+error under a target. The error is a positional violation in pixels:
+PinJoint distance error, SlideJoint distance outside [min, max], PivotJoint
+anchor separation, GrooveJoint anchor distance from the groove and,
+optionally, contact penetration beyond the collision slop. angular_error
+measures RotaryLimitJoint and GearJoint in radians, it isn't part of the
+controller error since the units differ. The target applies to the worst
+violation, or to the mean one with metric="mean" (useful when a few joints
+can never be satisfied, like the end pins of a heavy hanging chain).
+
+Only the constraints and bodies the controller is given are measured, by
+default every constraint of the space and, for penetration, the bodies of
+those constraints. The error is smoothed with a moving average before it's
+compared to the target, iterations go up when it's over the target by more
+than dead_band, come down in small steps once it has stayed under it for a
+while, and stay put for settle_steps after every change so the average can
+follow. A quiet scene runs with few iterations, a stressed one gets what it
+needs, and solver noise doesn't make the count swing.
+"""
+
+import pymunk
+
+
+def constraint_error(constraint):
+    #positional violation in pixels, None for constraint types that aren't measured
+    if isinstance(constraint, pymunk.PivotJoint):
+        return constraint.a.local_to_world(constraint.anchor_a).get_distance(constraint.b.local_to_world(constraint.anchor_b))
+    if isinstance(constraint, pymunk.GrooveJoint):
+        groove_a = constraint.a.local_to_world(constraint.groove_a)
+        groove_b = constraint.a.local_to_world(constraint.groove_b)
+        anchor = constraint.b.local_to_world(constraint.anchor_b)
+        groove = groove_b - groove_a
+        t = max(0.0, min(1.0, (anchor - groove_a).dot(groove) / groove.get_length_sqrd())) if groove.get_length_sqrd() else 0.0
+        return anchor.get_distance(groove_a + groove * t)
+    if isinstance(constraint, (pymunk.PinJoint, pymunk.SlideJoint)):
+        distance = constraint.a.local_to_world(constraint.anchor_a).get_distance(constraint.b.local_to_world(constraint.anchor_b))
+        if isinstance(constraint, pymunk.PinJoint):
+            return abs(distance - constraint.distance)
+        return max(0.0, constraint.min - distance, distance - constraint.max)
+    return None
+
+
+def angular_error(constraint):
+    #rotational violation in radians, None for constraint types that aren't measured
+    if isinstance(constraint, pymunk.RotaryLimitJoint):
+        angle = constraint.b.angle - constraint.a.angle
+        return max(0.0, constraint.min - angle, angle - constraint.max)
+    if isinstance(constraint, pymunk.GearJoint):
+        return abs(constraint.b.angle * constraint.ratio - constraint.a.angle - constraint.phase)
+    return None
+
+
+
+class IterationController:
+    measured_types = (pymunk.PinJoint, pymunk.SlideJoint, pymunk.PivotJoint, pymunk.GrooveJoint)
+
+    def __init__(self, space, target_error=1.0, min_iterations=5, max_iterations=40,
+                 lower_ratio=0.8, calm_steps=30, measure_contacts=False, metric="max",
+                 constraints=None, bodies=None, smoothing=0.05, dead_band=0.25, settle_steps=30):
+        '''
+        constraints and bodies limit what is measured, None takes the constraints of the space and
+        the bodies of the measured constraints. smoothing is the weight of a new error in the average.
+        '''
+        if metric not in ("max", "mean"):
+            raise Exception(f"{metric} is not an error metric, use max or mean.")
+        self.space = space
+        self.target_error = target_error
+        self.min_iterations = min_iterations
+        self.max_iterations = max_iterations
+        self.lower_ratio = lower_ratio
+        self.calm_steps = calm_steps
+        self.measure_contacts = measure_contacts
+        self.metric = metric
+        self.smoothing = smoothing
+        self.dead_band = dead_band
+        self.settle_steps = settle_steps
+
+        self.space.iterations = min(max(space.iterations, min_iterations), max_iterations)
+        self.given_constraints = constraints
+        self.given_bodies = bodies
+        self.constraints = []
+        self.bodies = []
+        self.constraint_count = -1
+        self.calm = 0
+        self.settling = 0
+
+        #metrics of the last update
+        self.smoothed_error = None
+        self.error = 0.0
+        self.mean_error = 0.0
+        self.constraint_error = 0.0
+        self.contact_error = 0.0
+
+
+    @property
+    def iterations(self):
+        return self.space.iterations
+
+
+    def measured_constraints(self):
+        #the filtered lists are only rebuilt when constraints are added or removed
+        constraints = self.space.constraints if self.given_constraints is None else self.given_constraints
+        if len(constraints) != self.constraint_count:
+            self.constraints = [c for c in constraints if isinstance(c, IterationController.measured_types)]
+            self.constraint_count = len(constraints)
+            if self.given_bodies is None:
+                self.bodies = list({body: None for c in self.constraints for body in (c.a, c.b)
+                                    if body.body_type == pymunk.Body.DYNAMIC})
+        return self.constraints
+
+
+    def measure_constraints(self):
+        worst = 0.0
+        total = 0.0
+        constraints = self.measured_constraints()
+        for constraint in constraints:
+            error = constraint_error(constraint)
+            total += error
+            if error > worst:
+                worst = error
+        return worst, total / len(constraints) if constraints else 0.0
+
+
+    def measure_penetration(self):
+        worst = [0.0]
+        def check(arbiter):
+            for point in arbiter.contact_point_set.points:
+                if -point.distance > worst[0]:
+                    worst[0] = -point.distance
+        if self.given_bodies is None:
+            self.measured_constraints()
+        for body in self.bodies if self.given_bodies is None else self.given_bodies:
+            if not body.is_sleeping:
+                body.each_arbiter(check)
+        return max(0.0, worst[0] - self.space.collision_slop)
+
+
+    def update(self):
+        #call after every space.step
+        self.constraint_error, self.mean_error = self.measure_constraints()
+        self.contact_error = self.measure_penetration() if self.measure_contacts else 0.0
+        if self.metric == "mean":
+            self.error = max(self.mean_error, self.contact_error)
+        else:
+            self.error = max(self.constraint_error, self.contact_error)
+        if self.smoothed_error is None:
+            self.smoothed_error = self.error
+        else:
+            self.smoothed_error += (self.error - self.smoothed_error) * self.smoothing
+
+        if self.settling:
+            #the average still follows the last change
+            self.settling -= 1
+            return
+        iterations = self.space.iterations
+        if self.smoothed_error > self.target_error * (1 + self.dead_band):
+            #over target: raise
+            iterations += max(1, iterations // 4)
+            self.calm = 0
+        elif self.smoothed_error < self.target_error * self.lower_ratio:
+            #under target for a while: lower slowly
+            self.calm += 1
+            if self.calm >= self.calm_steps:
+                iterations -= max(1, iterations // 8)
+                self.calm = 0
+        else:
+            self.calm = 0
+        iterations = min(max(iterations, self.min_iterations), self.max_iterations)
+        if iterations != self.space.iterations:
+            self.space.iterations = iterations
+            self.settling = self.settle_steps
+
+
+    def stats(self):
+        text = f"iterations: {self.space.iterations}  error: {self.constraint_error:.2f} (mean {self.mean_error:.2f}, smoothed {self.smoothed_error or 0:.2f})"
+        if self.measure_contacts:
+            text += f"  penetration: {self.contact_error:.2f}"
+        return text
@@ -0,0 +1,144 @@
+"""Non-blocking binary telemetry for collision callbacks.
+
+Callbacks write fixed-layout records (step, shape ids, impulse, contact point)
+into an in-memory ring buffer with a single struct.pack_into, a background
+thread flushes the ring into a memory-mapped log file. The callback never
+waits: if the ring is full the record is dropped and counted. Shape ids are
+the ids of the shared ShapeRegistry table.
+
+File layout: 16 bytes header (magic, record size, record count) followed by
+the records. Run this module with a log path to read it back:
+
+    python telemetry.py collisions.tlm
+"""
+
+import mmap
+import struct
+import sys
+import threading
+
+import numpy as np
+
+from registry import ShapeRegistry
+
+
+class TelemetrySink:
+    header = struct.Struct("<4sIQ")
+    magic = b"PMTL"
+    record = struct.Struct("<IIIffff")
+    dtype = np.dtype([("step", "<u4"), ("shape_a", "<u4"), ("shape_b", "<u4"),
+                      ("impulse_x", "<f4"), ("impulse_y", "<f4"), ("point_x", "<f4"), ("point_y", "<f4")])
+
+    def __init__(self, path, capacity=65536, flush_interval=0.1, file_records=65536):
+        self.path = path
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+
+        self.ring = bytearray(capacity * self.record.size)
+        self.head = 0
+        self.tail = 0
+        self.dropped = 0
+        self.current_step = 0
+
+        self.file = open(path, "w+b")
+        self.file_records = file_records
+        self.file.truncate(self.header.size + file_records * self.record.size)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.written = 0
+        self.write_header()
+
+        self.running = True
+        self.wakeup = threading.Event()
+        self.thread = threading.Thread(target=self.flush_loop, daemon=True)
+        self.thread.start()
+
+
+    def step(self):
+        #call after every space.step
+        self.current_step += 1
+
+
+    def write(self, shape_a, shape_b, impulse=(0.0, 0.0), point=(0.0, 0.0)):
+        #producer side, only touches head: the flush thread only touches tail
+        if self.head - self.tail >= self.capacity:
+            self.dropped += 1
+            return
+        offset = (self.head % self.capacity) * self.record.size
+        self.record.pack_into(self.ring, offset, self.current_step, ShapeRegistry.id_of(shape_a), ShapeRegistry.id_of(shape_b),
+                              impulse[0], impulse[1], point[0], point[1])
+        self.head += 1
+
+
+    def write_arbiter(self, arbiter):
+        points = arbiter.contact_point_set.points
+        point = points[0].point_a if points else (0.0, 0.0)
+        self.write(arbiter.shapes[0], arbiter.shapes[1], arbiter.total_impulse, point)
+
+
+    ### Flushing
+    def write_header(self):
+        self.header.pack_into(self.map, 0, self.magic, self.record.size, self.written)
+
+    def grow(self, records):
+        while self.written + records > self.file_records:
+            self.file_records *= 2
+        self.map.close()
+        self.file.truncate(self.header.size + self.file_records * self.record.size)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+
+    def flush(self):
+        head = self.head
+        count = head - self.tail
+        if count <= 0:
+            return
+        if self.written + count > self.file_records:
+            self.grow(count)
+
+        size = self.record.size
+        first = self.tail % self.capacity
+        out = self.header.size + self.written * size
+        #the pending records may wrap around the end of the ring
+        first_part = min(count, self.capacity - first)
+        self.map[out:out + first_part * size] = self.ring[first * size:(first + first_part) * size]
+        if count > first_part:
+            rest = count - first_part
+            out += first_part * size
+            self.map[out:out + rest * size] = self.ring[:rest * size]
+
+        self.written += count
+        self.tail = head
+        self.write_header()
+
+    def flush_loop(self):
+        while self.running:
+            self.wakeup.wait(self.flush_interval)
+            self.flush()
+
+    def close(self):
+        self.running = False
+        self.wakeup.set()
+        self.thread.join()
+        self.flush()
+        self.map.flush()
+        self.map.close()
+        self.file.truncate(self.header.size + self.written * self.record.size)
+        self.file.close()
+
+
+
+def read_log(path):
+    with open(path, "rb") as log_file:
+        data = log_file.read()
+    magic, record_size, count = TelemetrySink.header.unpack_from(data, 0)
+    if magic != TelemetrySink.magic or record_size != TelemetrySink.record.size:
+        raise Exception(f"{path} is not a telemetry log.")
+    return np.frombuffer(data, dtype=TelemetrySink.dtype, count=count, offset=TelemetrySink.header.size)
+
+
+if __name__ == "__main__":
+    records = read_log(sys.argv[1])
+    print(f"{len(records)} records")
+    if len(records):
+        print(f"steps {records['step'].min()} - {records['step'].max()}")
+    for record in records[:int(sys.argv[2]) if len(sys.argv) > 2 else 20]:
+        print(record)
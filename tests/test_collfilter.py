@@ -0,0 +1,43 @@
+from collfilter import CollFilter
+
+
+def test_shared_group_stays_taken_until_every_filter_is_released():
+    group = CollFilter.new_group()
+    a = CollFilter("shared_a", group=group)
+    b = CollFilter("shared_b", group=group)
+    CollFilter.release_group(group)
+
+    a.release()
+    other = CollFilter.new_group()
+    assert other != group
+    assert b.filter.group == group
+
+    b.release()
+    assert CollFilter.new_group() == group
+    CollFilter.release_group(group)
+    CollFilter.release_group(other)
+
+
+def test_caller_group_is_not_handed_out():
+    group = CollFilter.next_group + 100
+    a = CollFilter("caller_group", group=group)
+    a.release()
+    assert group not in CollFilter.free_groups
+
+
+def test_double_release_raises():
+    a = CollFilter("twice", group=CollFilter.new_group())
+    CollFilter.release_group(a.filter.group)
+    a.release()
+    try:
+        a.release()
+    except Exception:
+        pass
+    else:
+        assert False, "second release didn't raise"
+    try:
+        CollFilter.release_group(a.filter.group)
+    except Exception:
+        pass
+    else:
+        assert False, "released group was released again"
@@ -0,0 +1,70 @@
+import pymunk
+
+from rollback import RollbackSession, LoopbackTransport
+
+
+class Player:
+    def __init__(self, space, x):
+        self.body = pymunk.Body(1, 1)
+        self.body.position = x, 0
+        space.add(self.body)
+        self.jumps = 0
+
+    def get_state(self):
+        return self.jumps
+
+    def set_state(self, state):
+        self.jumps = state
+
+
+def remote_input(frame):
+    #changes often enough that most predictions are wrong
+    return (frame // 7) % 3 - 1, frame % 11 == 0
+
+
+def run(budget_ms, frames=120):
+    space = pymunk.Space()
+    space.gravity = 0, 100
+    players = [Player(space, 0), Player(space, 100)]
+
+    def step(inputs):
+        for player, (direction, jump) in zip(players, inputs):
+            player.body.velocity += direction * 10, -50 if jump else 0
+            player.jumps += jump
+        space.step(1 / 60)
+
+    session = RollbackSession(space, players, step, budget_ms=budget_ms)
+    transport = LoopbackTransport(delay=6)
+    session.most_replayed = 0
+    for frame in range(frames):
+        session.add_local_input(0, (1, False))
+        if frame < frames - 20:
+            transport.send(1, frame, remote_input(frame))
+        else:
+            transport.send(1, frame, (0, False))
+        for player_id, input_frame, player_input in transport.receive(frame):
+            session.add_remote_input(player_id, input_frame, player_input)
+        session.advance()
+        session.most_replayed = max(session.most_replayed, session.last_resim_frames)
+    return session, players
+
+
+def test_clipped_rollback_ends_like_an_unclipped_one():
+    unclipped, unclipped_players = run(budget_ms=1e9)
+    clipped, clipped_players = run(budget_ms=1e-9)
+
+    assert unclipped.clipped_rollbacks == 0
+    assert clipped.clipped_rollbacks > 0
+    assert clipped.behind == 0
+    for a, b in zip(unclipped_players, clipped_players):
+        assert a.body.position == b.body.position
+        assert a.body.velocity == b.body.velocity
+        assert a.jumps == b.jumps
+
+
+def test_clipped_rollback_replays_what_the_budget_affords():
+    session, players = run(budget_ms=1e-9)
+    unclipped, unclipped_players = run(budget_ms=1e9)
+    #the budget affords one frame, the rest of a rollback waits for the next advance
+    assert session.most_replayed == 1
+    assert unclipped.most_replayed > 1